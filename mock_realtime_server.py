@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Local mock of the OpenAI Realtime WebSocket API for the Real-time Voice Translator
+Speaks enough of the protocol (server VAD, transcription and text responses) to
+exercise the streaming provider without an API key. Point the app at it with
+"realtime_url": "ws://localhost:8765" in translator_config.json.
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import sys
+
+import numpy as np
+
+try:
+    from websockets.asyncio.server import serve
+    from websockets.exceptions import ConnectionClosed
+except ImportError:
+    print("The mock server needs websockets: pip install websockets")
+    sys.exit(1)
+
+SAMPLE_RATE = 24000
+FRAME = SAMPLE_RATE // 50  # 20 ms VAD frames
+
+ids = itertools.count(1)
+
+
+def new_id(prefix):
+    return f"{prefix}_{next(ids):06d}"
+
+
+class MockSession:
+    """One client connection: energy VAD over the streamed audio, canned replies per turn"""
+
+    def __init__(self, connection, threshold, drop_after, delay):
+        self.connection = connection
+        self.threshold = threshold
+        self.drop_after = drop_after
+        self.delay = delay
+        self.silence_ms = 500
+        self.pending = np.zeros(0, dtype=np.int16)  # Samples not yet in a full frame
+        self.position = 0  # Samples received in this session
+        self.speech_start = None
+        self.last_speech = 0
+        self.item_id = None
+        self.previous_item_id = None
+        self.turns = 0
+
+    async def send(self, event_type, **fields):
+        await self.connection.send(json.dumps({'type': event_type, 'event_id': new_id('event'), **fields}))
+
+    async def run(self):
+        await self.send('session.created', session={'id': new_id('sess')})
+        async for message in self.connection:
+            event = json.loads(message)
+            kind = event.get('type')
+            if kind == 'session.update':
+                turn_detection = event.get('session', {}).get('turn_detection') or {}
+                self.silence_ms = turn_detection.get('silence_duration_ms', self.silence_ms)
+                await self.send('session.updated', session=event.get('session', {}))
+            elif kind == 'input_audio_buffer.append':
+                samples = np.frombuffer(base64.b64decode(event['audio']), dtype=np.int16)
+                await self.feed(samples)
+            elif kind == 'conversation.item.delete':
+                await self.send('conversation.item.deleted', item_id=event.get('item_id'))
+            else:
+                await self.send('error', error={'type': 'invalid_request_error',
+                                                'message': f"Mock server ignores '{kind}'"})
+
+    async def feed(self, samples):
+        """Run the VAD over new samples and finish a turn after silence_ms of quiet"""
+        self.pending = np.concatenate([self.pending, samples])
+        while len(self.pending) >= FRAME:
+            frame, self.pending = self.pending[:FRAME], self.pending[FRAME:]
+            self.position += FRAME
+            now_ms = self.position * 1000 // SAMPLE_RATE
+            if np.abs(frame.astype(np.int32)).mean() > self.threshold:
+                self.last_speech = now_ms
+                if self.speech_start is None:
+                    self.speech_start = max(0, now_ms - 20)
+                    self.item_id = new_id('item')
+                    await self.send('input_audio_buffer.speech_started',
+                                    audio_start_ms=self.speech_start, item_id=self.item_id)
+            elif self.speech_start is not None and now_ms - self.last_speech >= self.silence_ms:
+                await self.finish_turn(now_ms)
+
+    async def finish_turn(self, end_ms):
+        item_id, duration = self.item_id, (self.last_speech - self.speech_start) / 1000
+        self.speech_start = None
+        self.turns += 1
+        await self.send('input_audio_buffer.speech_stopped', audio_end_ms=end_ms, item_id=item_id)
+        await self.send('input_audio_buffer.committed', item_id=item_id, previous_item_id=self.previous_item_id)
+        self.previous_item_id = item_id
+
+        transcript = f"mock speech {self.turns} ({duration:.1f} s)"
+        for word in transcript.split(' '):
+            await asyncio.sleep(self.delay)
+            await self.send('conversation.item.input_audio_transcription.delta', item_id=item_id,
+                            content_index=0, delta=word + ' ')
+        await self.send('conversation.item.input_audio_transcription.completed', item_id=item_id,
+                        content_index=0, transcript=transcript)
+
+        response_id, output_id = new_id('resp'), new_id('item')
+        await self.send('response.created', response={'id': response_id, 'status': 'in_progress', 'output': []})
+        translation = f"mock translation {self.turns}"
+        for word in translation.split(' '):
+            await asyncio.sleep(self.delay)
+            await self.send('response.text.delta', response_id=response_id, item_id=output_id,
+                            output_index=0, content_index=0, delta=word + ' ')
+        await self.send('response.text.done', response_id=response_id, item_id=output_id,
+                        output_index=0, content_index=0, text=translation)
+        await self.send('response.done', response={'id': response_id, 'status': 'completed',
+                                                    'output': [{'id': output_id, 'type': 'message'}]})
+
+        if self.drop_after and self.turns % self.drop_after == 0:
+            print(f"Dropping the connection after {self.turns} turns")
+            await self.connection.close(code=1011, reason='mock drop')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--threshold', type=float, default=500, help="Mean amplitude that counts as speech")
+    parser.add_argument('--drop-after', type=int, default=0,
+                        help="Close the connection after every N turns to test reconnecting")
+    parser.add_argument('--delay', type=float, default=0.05, help="Seconds between streamed deltas")
+    args = parser.parse_args()
+
+    async def handler(connection):
+        print(f"Client connected: {connection.request.path}")
+        try:
+            await MockSession(connection, args.threshold, args.drop_after, args.delay).run()
+        except ConnectionClosed:
+            pass
+        print("Client disconnected")
+
+    async def serve_forever():
+        # Audio keeps arriving while a turn is answered; an unbounded queue keeps reading it (and the
+        # client's reply to a --drop-after close) instead of pausing until the close times out
+        async with serve(handler, 'localhost', args.port, max_size=None, max_queue=None):
+            print(f"Mock Realtime API listening on ws://localhost:{args.port}")
+            await asyncio.Future()
+
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,25 +5,1970 @@ import queue
 import time
 import json
 import os
-import pyaudio
-import wave
+try:
+    import pyaudio
+except ImportError:  # Reported by setup_audio; the rest of the module (and its tests) work without it
+    pyaudio = None
 import base64
 import io
-from openai import OpenAI
+import struct
+import itertools
+import collections
+import asyncio
+import sqlite3
+import re
+import random
+import hashlib
+import importlib.util
+import urllib.parse
+import concurrent.futures
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIConnectionError
 import numpy as np
 from datetime import datetime
 
+
+class AudioRingBuffer:
+    """Preallocated int16 ring buffer filled from the PyAudio callback.
+
+    Every sample is stored twice (at ``i`` and ``i + capacity``) so any window of
+    up to ``capacity`` samples is one contiguous slice and can be handed out as a
+    zero-copy NumPy view. Positions are absolute sample counts since the stream
+    started. A view stays valid until the writer laps it, i.e. until another
+    ``capacity`` samples have been captured; ``copy`` detaches a window that
+    must outlive that.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity * 2, dtype=np.int16)
+        self.write_pos = 0
+        self.write_end = 0  # End of the chunk being written; equals write_pos between writes
+        self.overruns = 0  # Segments lost because the reader was lapped
+        self.input_overflows = 0  # Overflows reported by PortAudio
+        self.condition = threading.Condition()
+
+    def write(self, data):
+        """Copy one callback chunk into the ring (called from the audio thread)"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        count = len(samples)
+        if count > self.capacity:
+            samples = samples[-self.capacity:]
+            self.overruns += 1
+        n = len(samples)
+        self.write_end = self.write_pos + count
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[start + self.capacity:start + self.capacity + first] = samples[:first]
+        rest = n - first
+        if rest:
+            self.buffer[:rest] = samples[first:]
+            self.buffer[self.capacity:self.capacity + rest] = samples[first:]
+        
+        with self.condition:
+            self.write_pos += count
+            self.condition.notify_all()
+
+    def wait_for(self, position, timeout=None):
+        """Block until at least ``position`` samples have been written"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.write_pos >= position, timeout)
+
+    def read(self, start, length):
+        """Return a zero-copy view of ``length`` samples starting at ``start``
+
+        Returns None (and counts an overrun) if the writer already overwrote part
+        of the requested window.
+        """
+        if length > self.capacity or self.write_pos - start > self.capacity:
+            self.overruns += 1
+            return None
+        offset = start % self.capacity
+        return self.buffer[offset:offset + length]
+
+    def copy(self, start, length):
+        """Return a copy of ``length`` samples starting at ``start`` that outlives the writer lapping it
+
+        Returns None (and counts an overrun) if part of the window was already
+        overwritten, including by a write still in progress during the copy.
+        """
+        view = self.read(start, length)
+        if view is None:
+            return None
+        audio = view.copy()
+        if self.write_end - start > self.capacity:
+            self.overruns += 1
+            return None
+        return audio
+
+
+class MemoryviewReader(io.RawIOBase):
+    """Seekable read-only file object over a memoryview.
+
+    Lets the HTTP client stream a framed payload in chunks instead of needing a
+    full ``bytes`` copy of it first.
+    """
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view.cast('B')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        count = max(0, min(len(target), len(self.view) - self.position))
+        target[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+class NoiseFloorEstimator:
+    """Tracks the background noise level and scores frames by SNR.
+
+    The floor follows the energy of non-speech frames: it drops quickly when the
+    room gets quieter and rises slowly when it gets louder, so a constant hum or
+    fan is learned as noise instead of being sent off as speech. A segment only
+    counts as speech if enough of its frames stand above the floor.
+    """
+
+    def __init__(self, frame_length, speech_snr_db=10.0, min_speech_ratio=0.2,
+                 initial_floor=100.0, min_floor=20.0, rise=0.01, fall=0.2):
+        self.frame_length = frame_length
+        self.speech_snr_db = speech_snr_db
+        self.min_speech_ratio = min_speech_ratio
+        self.floor = float(initial_floor)
+        self.min_floor = min_floor
+        self.rise = rise
+        self.fall = fall
+        self.accepted = 0
+        self.suppressed = 0
+
+    def frame_energies(self, samples):
+        """Mean absolute amplitude of each complete frame in ``samples``"""
+        count = len(samples) // self.frame_length
+        frames = samples[:count * self.frame_length].reshape(count, self.frame_length)
+        return np.abs(frames).mean(axis=1)
+
+    def snr_db(self, energies):
+        """Per-frame signal-to-noise ratio against the current floor"""
+        return 20 * np.log10(np.maximum(energies, 1.0) / self.floor)
+
+    def update(self, energies, speech):
+        """Adapt the floor from a batch of frame energies and their speech flags"""
+        if len(energies) == 0:
+            return
+        noise = energies[~speech]
+        # While speech never pauses, creep up towards the quietest frame instead
+        level = float(np.median(noise)) if len(noise) else float(energies.min())
+        rate = self.fall if level < self.floor else self.rise
+        alpha = 1 - (1 - rate) ** len(energies)
+        self.floor = max(self.min_floor, self.floor + alpha * (level - self.floor))
+
+    def holds_speech(self, samples, adapt=False):
+        """Decide whether a segment contains enough speech frames to be worth sending"""
+        energies = self.frame_energies(samples)
+        if len(energies) == 0:
+            self.suppressed += 1
+            return False
+        speech = self.snr_db(energies) > self.speech_snr_db
+        if adapt:
+            self.update(energies, speech)
+        if speech.mean() >= self.min_speech_ratio:
+            self.accepted += 1
+            return True
+        self.suppressed += 1
+        return False
+
+
+class VoiceActivitySegmenter:
+    """Energy + zero-crossing-rate endpointer that cuts speech into segments.
+
+    Reads whole frames straight out of an AudioRingBuffer, classifies them in one
+    vectorized pass and runs a small state machine with hangover so a segment is
+    closed as soon as the speaker pauses. Segments are returned as absolute
+    ``(start, end)`` sample positions in the ring.
+    """
+
+    MIN_PAUSE_MS = 100  # Shorter gaps count as part of the speech run
+
+    def __init__(self, sample_rate, threshold, frame_ms=30, hangover_ms=300,
+                 min_segment_seconds=0.5, max_segment_seconds=10.0, pre_roll_ms=150,
+                 noise_floor=None, on_pause=None):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_length = max(1, int(sample_rate * frame_ms / 1000))
+        self.threshold = threshold
+        self.noise_floor = noise_floor  # NoiseFloorEstimator, or None for the static threshold
+        self.on_pause = on_pause  # Called with (speech ms, pause ms) whenever speech resumes
+        self.hangover_frames = max(1, int(round(hangover_ms / frame_ms)))
+        self.min_samples = int(sample_rate * min_segment_seconds)
+        self.max_samples = int(sample_rate * max_segment_seconds)
+        self.pre_roll = int(sample_rate * pre_roll_ms / 1000)
+        self.run_frames = 0  # Speech frames since the last pause
+        self.gap_frames = 0  # Silent frames since the last speech
+        self.reset(0)
+
+    def set_limits(self, hangover_ms, max_segment_seconds):
+        """Change the pause that ends a segment and the length that forces a cut"""
+        self.hangover_frames = max(1, int(np.ceil(hangover_ms / self.frame_ms)))
+        self.max_samples = int(self.sample_rate * max_segment_seconds)
+
+    def reset(self, position):
+        """Drop any open segment and continue reading at ``position``"""
+        self.position = position
+        self.in_speech = False
+        self.segment_start = 0
+        self.silent_frames = 0
+
+    def classify(self, frames):
+        """Return a speech/non-speech flag per row of a (frames, samples) array"""
+        energy = np.abs(frames).mean(axis=1)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frames.shape[1]
+        if self.noise_floor is None:
+            # Voiced speech is loud; unvoiced consonants are quieter but noisy
+            voiced = energy > self.threshold
+            unvoiced = (energy > self.threshold * 0.5) & (zcr > 0.25)
+            return voiced | unvoiced
+        
+        snr = self.noise_floor.snr_db(energy)
+        voiced = snr > self.noise_floor.speech_snr_db
+        unvoiced = (snr > self.noise_floor.speech_snr_db - 4) & (zcr > 0.25)
+        speech = voiced | unvoiced
+        self.noise_floor.update(energy, speech)
+        return speech
+
+    def feed(self, ring):
+        """Classify all complete frames available in ``ring`` and return closed segments"""
+        available = (ring.write_pos - self.position) // self.frame_length
+        if available <= 0:
+            return []
+        view = ring.read(self.position, available * self.frame_length)
+        if view is None:
+            # Reader was lapped; resynchronise with the writer
+            self.reset(ring.write_pos)
+            return []
+        
+        segments = []
+        flags = self.classify(view.reshape(available, self.frame_length))
+        for is_speech in flags:
+            frame_end = self.position + self.frame_length
+            self.track_pause(is_speech)
+            if not self.in_speech:
+                if is_speech:
+                    self.in_speech = True
+                    self.segment_start = max(0, self.position - self.pre_roll,
+                                             ring.write_pos - ring.capacity)
+                    self.silent_frames = 0
+            elif is_speech:
+                self.silent_frames = 0
+            else:
+                self.silent_frames += 1
+                if self.silent_frames >= self.hangover_frames:
+                    self.close_segment(frame_end, segments)
+            
+            if self.in_speech and frame_end - self.segment_start >= self.max_samples:
+                # Force a cut in long monologues and keep listening
+                self.close_segment(frame_end, segments)
+                self.in_speech = bool(is_speech)
+                self.segment_start = frame_end
+                self.silent_frames = 0
+            self.position = frame_end
+        return segments
+
+    def close_segment(self, end, segments):
+        """Close the open segment, dropping it if it is shorter than the minimum"""
+        if end - self.segment_start >= self.min_samples:
+            segments.append((self.segment_start, end))
+        self.in_speech = False
+        self.silent_frames = 0
+
+    def track_pause(self, is_speech):
+        """Measure the speaker's speech runs and the pauses between them"""
+        if not is_speech:
+            if self.run_frames:
+                self.gap_frames += 1
+            return
+        if self.gap_frames * self.frame_ms >= self.MIN_PAUSE_MS:
+            if self.on_pause:
+                self.on_pause(self.run_frames * self.frame_ms, self.gap_frames * self.frame_ms)
+            self.run_frames = 0
+        else:
+            self.run_frames += self.gap_frames
+        self.gap_frames = 0
+        self.run_frames += 1
+
+
+class SegmentLengthController:
+    """Tunes segment length at runtime from provider latency, queue depth and the speaker's pauses
+
+    A least-squares fit over recent segments splits service time (queue and
+    quota waits excluded) into a fixed overhead and a cost per second of audio.
+    With ``workers`` requests in flight, segments of length L keep up with
+    speech at ``target_utilization`` when (overhead + cost * L) / (workers * L)
+    stays below it. ``quota_rate(L)`` (segments per second the rate limits
+    allow) caps the concurrency that is actually sustainable at quota rate
+    times latency. The target is the shortest L that keeps up, stretched
+    further while segments are queued. The segmenter then only cuts on pauses
+    long enough that the speaker's own pause pattern yields segments of about
+    that length.
+    """
+
+    MIN_SAMPLES = 5  # Segments needed before the latency fit is trusted
+    MIN_PAUSES = 10  # Pauses needed before the pause pattern is used
+    PRIOR_COST_PER_SECOND = 0.1  # Used while recent segments are too alike in length to fit
+    SEARCH_STEP = 0.25  # Seconds between candidate segment lengths
+
+    def __init__(self, initial_seconds=5.0, min_seconds=1.5, max_seconds=10.0, workers=3,
+                 target_utilization=0.5, min_hangover_ms=300, max_hangover_ms=1000, alpha=0.3,
+                 quota_rate=None):
+        self.min_seconds = min(min_seconds, max_seconds)
+        self.max_seconds = max_seconds
+        self.workers = max(1, workers)
+        self.quota_rate = quota_rate
+        self.target_utilization = target_utilization
+        self.min_hangover_ms = min_hangover_ms
+        self.max_hangover_ms = max(min_hangover_ms, max_hangover_ms)
+        self.alpha = alpha
+        self.segment_seconds = self.clamp(initial_seconds)
+        self.reported_seconds = self.segment_seconds
+        self.overhead = None
+        self.cost = None
+        self.latencies = collections.deque(maxlen=20)  # (audio seconds, latency seconds)
+        self.pauses = collections.deque(maxlen=200)  # (speech ms before the pause, pause ms)
+        self.lock = threading.Lock()
+
+    def clamp(self, seconds):
+        return min(self.max_seconds, max(self.min_seconds, seconds))
+
+    def observe_pause(self, speech_ms, pause_ms):
+        with self.lock:
+            self.pauses.append((speech_ms, pause_ms))
+
+    def observe_segment(self, audio_seconds, latency, queue_depth):
+        """Fold a finished segment into the latency model; True when the target moved noticeably"""
+        with self.lock:
+            self.latencies.append((audio_seconds, latency))
+            if len(self.latencies) < self.MIN_SAMPLES:
+                return False
+            self.overhead, self.cost = self.fit()
+            target = self.max_seconds
+            for seconds in np.arange(self.min_seconds, self.max_seconds, self.SEARCH_STEP):
+                if self.utilization(seconds) <= self.target_utilization:
+                    target = float(seconds)
+                    break
+            # Waiting segments mean the backend is behind; fewer, longer requests catch up
+            target = self.clamp(target * (1 + queue_depth / self.concurrency(target)))
+            self.segment_seconds += self.alpha * (target - self.segment_seconds)
+            if abs(self.segment_seconds - self.reported_seconds) < 0.5:
+                return False
+            self.reported_seconds = self.segment_seconds
+            return True
+
+    def concurrency(self, seconds):
+        """Requests that can usefully be in flight for segments of this length"""
+        if not self.quota_rate:
+            return self.workers
+        # Little's law: the quota's request rate times how long each request takes
+        latency = self.overhead + self.cost * seconds
+        return max(1e-6, min(self.workers, self.quota_rate(seconds) * latency))
+
+    def utilization(self, seconds):
+        """Share of the sustainable request capacity segments of this length would use"""
+        return (self.overhead + self.cost * seconds) / (self.concurrency(seconds) * seconds)
+
+    def fit(self):
+        """(overhead seconds, seconds per audio second) of recent requests"""
+        durations, latencies = np.array(self.latencies).T
+        cost = self.PRIOR_COST_PER_SECOND
+        if np.ptp(durations) >= 1.0:
+            cost = max(0.0, float(np.polyfit(durations, latencies, 1)[0]))
+        return max(0.0, float(latencies.mean() - cost * durations.mean())), cost
+
+    def hangover_ms(self):
+        """The shortest pause that, given the speaker's recent pauses, closes segments of about the target length"""
+        with self.lock:
+            if len(self.pauses) < self.MIN_PAUSES:
+                return self.min_hangover_ms
+            speech_ms = sum(speech for speech, _ in self.pauses)
+            cuts = int(speech_ms / (self.segment_seconds * 1000))
+            longest = sorted((pause for _, pause in self.pauses), reverse=True)
+        if cuts >= len(longest):
+            return self.min_hangover_ms
+        # Only the `cuts` longest pauses should end a segment
+        return min(self.max_hangover_ms, max(self.min_hangover_ms, longest[cuts] + 1))
+
+    def limits(self):
+        """(hangover ms, forced cut seconds) for the VAD segmenter"""
+        return self.hangover_ms(), min(self.max_seconds, round(2 * self.segment_seconds * 2) / 2)
+
+    def describe(self):
+        fit = ''
+        if self.overhead is not None:
+            fit = f" (requests take {self.overhead:.2f}s + {self.cost:.2f}s per audio second)"
+        return f"{self.segment_seconds:.1f}s target{fit}, cutting on pauses of {self.hangover_ms()} ms"
+
+
+class SequenceReorderBuffer:
+    """Releases results in sequence order even when they complete out of order"""
+
+    def __init__(self, first_sequence=0):
+        self.next_sequence = first_sequence
+        self.pending = {}
+
+    def add(self, sequence, item):
+        """Store a result and return every result that is now ready, in order"""
+        self.pending[sequence] = item
+        ready = []
+        while self.next_sequence in self.pending:
+            ready.append(self.pending.pop(self.next_sequence))
+            self.next_sequence += 1
+        return ready
+
+
+class StreamingFieldParser:
+    """Incrementally parses the SOURCE_LANGUAGE/CONFIDENCE/ORIGINAL/TRANSLATED format.
+
+    Complete lines are parsed once; the line still being streamed is re-read on
+    every delta so a field's value grows as tokens arrive.
+    """
+
+    FIELDS = ('SOURCE_LANGUAGE', 'CONFIDENCE', 'ORIGINAL', 'TRANSLATED')
+
+    def __init__(self):
+        self.pending_line = ''
+        self.fields = {}
+
+    def feed(self, delta):
+        """Add a token delta and return the fields parsed so far"""
+        self.pending_line += delta
+        *complete, self.pending_line = self.pending_line.split('\n')
+        for line in complete:
+            self.parse_line(line)
+        if self.pending_line:
+            self.parse_line(self.pending_line)
+        return self.fields
+
+    def parse_line(self, line):
+        for field in self.FIELDS:
+            if line.startswith(field + ':'):
+                self.fields[field] = line[len(field) + 1:].strip()
+                return
+
+
+class PrefixStabilizer:
+    """Splits overlapping-window transcripts into committed and tentative words
+
+    Each hypothesis covers the latest window of audio and consecutive windows
+    overlap. A new hypothesis is aligned against the previous one: words both
+    agree on, and words that have slid out of the new window, are committed
+    and never change again; the rest of the new hypothesis stays tentative
+    until the next window confirms or revises it.
+    """
+
+    # Thai, Lao, Myanmar, Khmer, Kana and CJK ideographs: compared character by character
+    UNSPACED_SCRIPTS = re.compile('[\u0e00-\u0eff\u1000-\u109f\u1780-\u17ff\u3040-\u30ff\u4e00-\u9fff]')
+
+    def __init__(self):
+        self.previous = []  # Tokens of the previous hypothesis
+        self.committed = 0  # How many of them are committed
+        self.joiner = ' '
+
+    def tokenize(self, text):
+        """Split into words, or characters for scripts written without spaces (Thai, Chinese...)"""
+        text = ' '.join(text.split())
+        if self.UNSPACED_SCRIPTS.search(text):
+            self.joiner = ''
+            return list(text)
+        self.joiner = ' '
+        return text.split()
+
+    @staticmethod
+    def normalize(token):
+        """Compare words without case or punctuation (characters as they are)"""
+        return re.sub(r'[^\w]', '', token.lower()) if len(token) > 1 else token.lower()
+
+    def align(self, previous, tokens):
+        """Find where ``tokens`` overlaps the end of ``previous``
+
+        Returns (offset into previous, leading tokens skipped, agreed run length)
+        for the longest run of matching tokens, or None. The first couple of new
+        tokens may be skipped, and the last previous token may be a prefix of its
+        match, because a window edge can cut a word in half.
+        """
+        best = None
+        words_previous = [self.normalize(token) for token in previous]
+        words = [self.normalize(token) for token in tokens]
+        last = len(previous) - 1
+        for offset in range(len(previous)):
+            for skip in range(min(3, len(tokens))):
+                run = 0
+                while offset + run < len(previous) and skip + run < len(tokens):
+                    word_previous, word = words_previous[offset + run], words[skip + run]
+                    if not (word_previous == word or
+                            (offset + run == last and word_previous and word.startswith(word_previous))):
+                        break
+                    run += 1
+                # A single common word is too weak unless it is all that overlaps
+                if run >= min(2, len(previous) - offset) and (best is None or run > best[2]):
+                    best = (offset, skip, run)
+        return best
+
+    def update(self, text, hop_fraction):
+        """Add a window's transcript; returns (newly committed text, tentative text)
+
+        ``hop_fraction`` is the share of the previous window the new one no
+        longer covers, used to commit by position when no overlap is found.
+        """
+        tokens = self.tokenize(text)
+        previous = self.previous
+        alignment = self.align(previous, tokens) if previous and tokens else None
+        if alignment:
+            offset, skip, run = alignment
+            # Where the hypotheses agree, commit the newer one's words (it heard more context)
+            start = max(self.committed, offset)
+            newly_committed = previous[self.committed:offset] + tokens[skip + start - offset:skip + run]
+            committed = max(skip + run, min(len(tokens), skip + self.committed - offset))
+        else:
+            shift = min(len(previous), int(round(len(previous) * hop_fraction)))
+            newly_committed = previous[self.committed:shift]
+            committed = min(len(tokens), max(0, self.committed - shift))
+        self.previous = tokens
+        self.committed = committed
+        return self.joiner.join(newly_committed).strip(), self.joiner.join(tokens[committed:]).strip()
+
+    def flush(self):
+        """Commit everything still tentative (at a pause) and start over"""
+        text = self.joiner.join(self.previous[self.committed:])
+        self.previous = []
+        self.committed = 0
+        return text
+
+
+class LocalLanguageDetector:
+    """Offline language identification from script ranges and n-gram features.
+
+    Non-Latin scripts that belong to a single language (Thai, Hangul, Kana,
+    Hebrew...) are decided by Unicode range. Latin, Cyrillic and Devanagari
+    (Hindi, Nepali, Marathi) text is scored against small per-language profiles of distinctive characters, common
+    words and character trigrams. Needs no network and runs in microseconds
+    for a sentence-sized transcript.
+    """
+
+    # (first code point, last code point, language or script group)
+    SCRIPT_RANGES = [
+        (0x0041, 0x024F, 'latin'),
+        (0x1E00, 0x1EFF, 'latin'),
+        (0x0400, 0x04FF, 'cyrillic'),
+        (0x0590, 0x05FF, 'he'),
+        (0x0600, 0x06FF, 'ar'),
+        (0x0900, 0x097F, 'devanagari'),
+        (0x0E00, 0x0E7F, 'th'),
+        (0x1100, 0x11FF, 'ko'),
+        (0x3040, 0x30FF, 'ja'),
+        (0x3130, 0x318F, 'ko'),
+        (0x4E00, 0x9FFF, 'zh'),
+        (0xAC00, 0xD7AF, 'ko'),
+    ]
+
+    # Language -> (script, distinctive characters, common words, character trigrams)
+    PROFILES = {
+        'en': ('latin', '', 'the and is are you to of in that it what this with for have not was be how thank', 'the ing and ion hat'),
+        'es': ('latin', 'ñ¿¡', 'el la los las de que y en es por para con una un no se lo como está gracias qué', 'ión que los ado'),
+        'fr': ('latin', 'œçèêëîôùû', 'le la les des et est un une je vous que qui pas pour dans ce il elle merci', 'ent les eux ais'),
+        'de': ('latin', 'ß', 'der die das und ist nicht ich sie ein eine zu mit den auf wie danke es', 'sch ich ein cht'),
+        'id': ('latin', '', 'yang dan di ini itu tidak saya anda ada dengan untuk ke apa terima kasih bisa akan', 'ang kan nya ber'),
+        'vi': ('latin', 'đơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ', 'là và của không có tôi bạn được này cho những một người cảm ơn', 'ông ười'),
+        'pt': ('latin', 'ãõ', 'o a os as de que e é não um uma para com em do da obrigado você está', 'ção ões que'),
+        'it': ('latin', 'ì', 'il la di che e è non un una per con sono mi ti grazie come questo', 'zio che gli ell'),
+        'nl': ('latin', 'ĳ', 'de het een en is van ik je niet dat die wat zijn met voor dank', 'ijk een aar oor'),
+        'pl': ('latin', 'łńśźżąę', 'i w nie na się jest to że z do jak co ale dziękuję tak', 'prz rze cie ych'),
+        'tr': ('latin', 'ğış', 'bir ve bu da de ne için ile çok ben sen evet hayır teşekkür değil mi', 'lar ler bir'),
+        'sv': ('latin', '', 'och att det är jag inte en som på för med har tack vad du', 'och att för'),
+        'da': ('latin', 'æø', 'og at det er jeg ikke en som på til med har tak hvad du', 'ikk det der'),
+        'no': ('latin', 'æø', 'og at det er jeg ikke en som på til med har takk hva du', 'ikk det kke'),
+        'fi': ('latin', '', 'ja on ei se että minä sinä mitä kiitos hän ole kuin mutta tämä', 'ssa llä sta ään'),
+        'cs': ('latin', 'ěřů', 'a je to se na že v jsem ne jak děkuji co ale také', 'ost pro ně'),
+        'hu': ('latin', 'őű', 'a az és egy nem hogy van is meg köszönöm mi ez de', 'gy sz egy nek'),
+        'ro': ('latin', 'ășțşţ', 'și este în nu un o de la cu că mulțumesc ce pe', 'ul ește are'),
+        'hr': ('latin', 'đ', 'i je u da se na ne to hvala što kako sam ali', 'ije što'),
+        'sk': ('latin', 'ĺľŕô', 'a je to sa na že v som nie ako ďakujem čo ale', 'ova nie'),
+        'sl': ('latin', '', 'in je v da se na ne to hvala kaj kako sem ali', 'ali kaj'),
+        'et': ('latin', 'õ', 'ja on ei see et mina sina mis aitäh kas ka', 'ise gas'),
+        'lv': ('latin', 'āēģīķļņ', 'un ir ne tas es tu kā paldies bet ar uz', 'ies jās'),
+        'lt': ('latin', 'ėįų', 'ir yra ne tai aš tu kaip ačiū bet su į', 'ras ių'),
+        'sq': ('latin', 'ë', 'dhe është në një të për me nuk faleminderit si ju', 'ërë hë'),
+        'bs': ('latin', 'đ', 'i je u da se na ne to hvala šta kako sam', 'šta ije'),
+        'me': ('latin', 'śź', 'i je u da se na ne to hvala šta kako sam đe', 'šta'),
+        'is': ('latin', 'ðþ', 'og að er ég ekki það en sem á takk hvað þú', 'að'),
+        'ga': ('latin', '', 'agus is an na tá ní go ar le dia duit conas', 'bh mh'),
+        'cy': ('latin', 'ŵŷ', 'a yn y mae ac i ar o diolch sut ydych dw', 'dd ll'),
+        'mt': ('latin', 'ċġħ', 'u il ta li hu hi ma jien grazzi kif int', 'ħ'),
+        'eu': ('latin', '', 'eta da ez bat du dut zer nola eskerrik asko ni zu', 'tz tx ak'),
+        'ca': ('latin', '·', 'el la els les de que i és no un una per amb gràcies com', 'ció ent'),
+        'gl': ('latin', '', 'o a os as de que e é non un unha para con grazas como', 'ción nh'),
+        'ru': ('cyrillic', 'ыэё', 'и в не на что я ты это как спасибо он она', 'ого ени'),
+        'uk': ('cyrillic', 'іїєґ', 'і в не на що я ти це як дякую він вона', 'ння ого'),
+        'be': ('cyrillic', 'ўі', 'і ў не на што я ты гэта як дзякуй ён яна', 'ння'),
+        'bg': ('cyrillic', 'ъ', 'и в не на че аз ти това как благодаря той тя', 'ата ите'),
+        'mk': ('cyrillic', 'ѓќѕј', 'и во не на што јас ти ова како благодарам тој', 'ата'),
+        'sr': ('cyrillic', 'ђћј', 'и у не на што ја ти ово како хвала он она', 'ије'),
+        'hi': ('devanagari', '', 'है हैं का की में और नहीं यह मैं आप हम क्या से था थी कि भी रहा', 'हैं रहा ेगा'),
+        'ne': ('devanagari', '', 'छ छन् हो र मा पनि छैन म तपाईं यो त्यो हुन्छ थियो भयो गर्नुहोस्', 'न्छ एको ुहो'),
+        'mr': ('devanagari', 'ळ', 'आहे आहेत आणि नाही मी तू तुम्ही काय हे ते आम्ही होते पण खूप', 'च्या ाला ल्या'),
+    }
+
+    # Script -> language reported when no profile of that script matches at all
+    FALLBACK_LANGUAGES = {'latin': 'en', 'cyrillic': 'ru', 'devanagari': 'hi'}
+
+    def __init__(self):
+        self.profiles = {
+            code: (script, set(chars), set(words.split()), trigrams.split())
+            for code, (script, chars, words, trigrams) in self.PROFILES.items()
+        }
+
+    def script_of(self, char):
+        code_point = ord(char)
+        for first, last, script in self.SCRIPT_RANGES:
+            if first <= code_point <= last:
+                return script
+        return None
+
+    def detect(self, text):
+        """Return (language_code, confidence 0-100) for a piece of text"""
+        counts = {}
+        letters = 0
+        for char in text:
+            if char.isalpha():
+                letters += 1
+                script = self.script_of(char)
+                if script:
+                    counts[script] = counts.get(script, 0) + 1
+        if not counts:
+            return 'unknown', 0
+        
+        # Kana means Japanese even when most characters are Han
+        if counts.get('ja') and counts.get('zh'):
+            counts['ja'] += counts.pop('zh')
+        script = max(counts, key=counts.get)
+        share = counts[script] / letters
+        if script not in self.FALLBACK_LANGUAGES:
+            return script, int(round(60 + 39 * share))
+        
+        lowered = text.lower()
+        words = [word.strip(".,!?;:\"'()¿¡«»।॥") for word in lowered.split()]
+        scores = {}
+        for code, (profile_script, chars, common_words, trigrams) in self.profiles.items():
+            if profile_script != script:
+                continue
+            score = 2.0 * sum(1 for word in words if word in common_words)
+            score += sum(1 for char in lowered if char in chars)
+            score += 0.5 * sum(lowered.count(trigram) for trigram in trigrams)
+            scores[code] = score
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_code, best = ranked[0]
+        if best == 0:
+            return self.FALLBACK_LANGUAGES[script], 40
+        second = ranked[1][1] if len(ranked) > 1 else 0
+        margin = (best - second) / best
+        evidence = min(1.0, best / 4)
+        return best_code, int(round(min(99, 50 + 45 * margin * evidence + 4 * share)))
+
+
+class TranslationCache:
+    """LRU cache of text translations with an optional SQLite tier.
+
+    Keys are (normalized transcript, source language, target language, model),
+    so "Thank you." and "thank you" share an entry. The in-memory tier is
+    bounded (0 turns it off); the on-disk tier (if a path is given) survives
+    restarts and refills the memory tier on a hit. Disk writes are committed
+    by a writer thread, so callers, including the asyncio engine's event loop,
+    never wait on SQLite to store a translation.
+    """
+
+    def __init__(self, max_entries=512, path=None):
+        self.max_entries = max(0, int(max_entries))
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        self.writes = queue.Queue()
+        self.writer = None
+        if path:
+            try:
+                self.db = sqlite3.connect(path, check_same_thread=False)
+                # WAL lets lookups read while the writer thread commits
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute("CREATE TABLE IF NOT EXISTS translations "
+                                "(key TEXT PRIMARY KEY, translation TEXT NOT NULL)")
+                self.db.commit()
+                writer_db = sqlite3.connect(path, check_same_thread=False)
+            except sqlite3.Error as e:
+                print(f"Translation cache disabled on disk: {e}")
+                self.db = None
+            else:
+                self.writer = threading.Thread(target=self.write_to_disk, args=(writer_db,), daemon=True)
+                self.writer.start()
+
+    def make_key(self, text, source_lang, target_lang, model):
+        normalized = re.sub(r'\s+', ' ', text.lower()).strip().rstrip('.!?。！？')
+        return '\x1f'.join([normalized, str(source_lang).lower(), target_lang.lower(), model])
+
+    def get(self, text, source_lang, target_lang, model):
+        """Return the cached translation or None, counting the hit or miss"""
+        if not self.max_entries and self.db is None:
+            return None
+        key = self.make_key(text, source_lang, target_lang, model)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            
+            translation = None
+            if self.db is not None:
+                row = self.db.execute("SELECT translation FROM translations WHERE key = ?", (key,)).fetchone()
+                if row:
+                    translation = row[0]
+                    self.store(key, translation)
+            if translation is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return translation
+
+    def put(self, text, source_lang, target_lang, model, translation):
+        if not isinstance(translation, str) or not translation:
+            return  # Nothing worth replaying, and the disk tier only holds text
+        if not self.max_entries and self.db is None:
+            return
+        key = self.make_key(text, source_lang, target_lang, model)
+        with self.lock:
+            self.store(key, translation)
+            if self.db is not None:
+                self.writes.put((key, translation))
+
+    def store(self, key, translation):
+        """Insert into the memory tier and evict the least recently used entry"""
+        self.entries[key] = translation
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def write_to_disk(self, db):
+        """Writer thread: commit queued entries, several per transaction, until close()"""
+        try:
+            while True:
+                rows = [self.writes.get()]
+                while rows[-1] is not None and not self.writes.empty():
+                    rows.append(self.writes.get())
+                pending = [row for row in rows if row is not None]
+                if pending:
+                    try:
+                        db.executemany("INSERT OR REPLACE INTO translations (key, translation) VALUES (?, ?)",
+                                       pending)
+                        db.commit()
+                    except sqlite3.Error as e:
+                        print(f"Translation cache write failed: {e}")
+                if rows[-1] is None:
+                    return
+        finally:
+            db.close()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        if self.writer is not None:
+            self.writes.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.db is not None:
+            with self.lock:
+                self.db.close()
+                self.db = None
+
+
+class AudioFingerprintIndex:
+    """LRU index of recent segment fingerprints for skipping repeated audio
+
+    Each 16 ms hop of a segment is hashed to a 32-bit sub-fingerprint: one
+    bit per pair of adjacent frequency bands, set when their energy
+    difference shrinks from the previous hop. A looped announcement
+    re-captured through the room flips only some of these bits, so lookups
+    accept the stored segment with the lowest bit error rate over a few
+    hops of misalignment, counting only hops loud enough to carry sound.
+    """
+
+    BITS = 32
+
+    def __init__(self, sample_rate, max_entries=64, max_bit_error=0.33,
+                 frame_ms=64, max_shift_ms=250, min_seconds=1.0):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bit_error = max_bit_error
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.hop = self.frame_length // 4
+        self.max_shift = int(sample_rate * max_shift_ms / 1000) // self.hop
+        self.min_samples = int(sample_rate * min_seconds)
+        self.window = np.hanning(self.frame_length).astype(np.float32)
+        
+        # BITS + 1 log-spaced bands over the speech range, as FFT bin edges
+        edges_hz = np.geomspace(300, min(3000, sample_rate / 2), self.BITS + 2)
+        self.band_edges = np.round(edges_hz * self.frame_length / sample_rate).astype(int)
+        
+        self.entries = collections.OrderedDict()  # (model, target, digest) -> (fingerprint, translation)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, samples):
+        """(sub-fingerprints, loud-hop mask), or None if disabled or too short"""
+        if not self.max_entries or len(samples) < max(self.min_samples, 2 * self.frame_length):
+            return None
+        
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.frame_length)[::self.hop]
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        energies = np.add.reduceat(power, self.band_edges, axis=1)[:, :-1]
+        band_diff = np.diff(np.log(energies + 1e-9), axis=1)
+        bits = np.diff(band_diff, axis=0) < 0
+        
+        # Bits of near-silent hops are noise; leave them out of comparisons
+        loudness = energies.sum(axis=1)[1:]
+        loud = loudness >= 0.05 * np.percentile(loudness, 90)
+        return np.packbits(bits, axis=1).view('>u4').ravel(), loud
+
+    def bit_error_rate(self, a, b):
+        """Lowest share of differing bits over the allowed alignments"""
+        (bits_a, loud_a), (bits_b, loud_b) = a, b
+        needed = 0.5 * min(loud_a.sum(), loud_b.sum())
+        best = 1.0
+        for shift in range(-self.max_shift, self.max_shift + 1):
+            x = bits_a[max(shift, 0):]
+            y = bits_b[max(-shift, 0):]
+            overlap = min(len(x), len(y))
+            loud = loud_a[max(shift, 0):][:overlap] & loud_b[max(-shift, 0):][:overlap]
+            count = loud.sum()
+            if not count or count < needed:
+                continue
+            differing = np.unpackbits((x[:overlap][loud] ^ y[:overlap][loud]).view(np.uint8)).sum()
+            best = min(best, differing / (count * self.BITS))
+        return best
+
+    def get(self, fingerprint, model, target_lang):
+        """Return the translation of a near-identical recent segment, or None"""
+        if fingerprint is None:
+            return None
+        
+        with self.lock:
+            key = (model, target_lang, hash(fingerprint[0].tobytes()))
+            if key not in self.entries:
+                length = len(fingerprint[0])
+                for candidate in reversed(self.entries):
+                    stored = self.entries[candidate][0]
+                    if candidate[:2] != (model, target_lang) or abs(len(stored[0]) - length) > 0.2 * length:
+                        continue
+                    if self.bit_error_rate(fingerprint, stored) <= self.max_bit_error:
+                        key = candidate
+                        break
+                else:
+                    self.misses += 1
+                    return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][1]
+
+    def put(self, fingerprint, model, target_lang, translation):
+        if fingerprint is None:
+            return
+        
+        with self.lock:
+            key = (model, target_lang, hash(fingerprint[0].tobytes()))
+            self.entries[key] = (fingerprint, translation)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class TranslationError(RuntimeError):
+    """A segment could not be translated; the message is shown in its place"""
+
+
+class ProviderUnavailableError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stops requests to a provider that keeps failing
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    requests fail immediately. Once ``reset_seconds`` have passed a single
+    probe request is let through; its success closes the circuit again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a request may be sent now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.probing = True
+            return True
+
+    def release_probe(self):
+        """Let another probe through after one was cancelled before it got an answer"""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                print(f"{self.name} circuit closed; requests resume")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                print(f"{self.name} circuit opened after {self.failures} failures; "
+                      f"next probe in {self.reset_seconds}s")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class LatencyWindow:
+    """Latencies of a model's most recent successful requests"""
+
+    def __init__(self, size=100):
+        self.samples = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q, min_samples=10):
+        """The q-th percentile in seconds, or None until enough requests were seen"""
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            return float(np.percentile(self.samples, q))
+
+
+class ModelRouter:
+    """Picks the audio model for each segment from live latency, error and cost estimates
+
+    Every model keeps exponentially weighted moving averages (EWMA) of its
+    end-to-end latency, per segment-length bucket, and of its error rate and
+    cost. A segment goes to the first model in preference order whose
+    predicted latency for a segment of its length fits the budget. Stats not
+    refreshed for ``stale_seconds`` fall back to the priors, so a model that
+    was slow once is tried again later.
+    """
+
+    LENGTH_BUCKETS = (3.0, 8.0)  # Segment seconds splitting short / medium / long
+
+    # Rough latency for a ~5 s segment and price per audio minute (USD)
+    PRIORS = {
+        'whisper-translate': (1.2, 0.006),
+        'whisper-1': (2.0, 0.007),
+        'local-whisper': (2.0, 0.001),
+        'local-offline': (2.5, 0.0),
+        'gemini-1.5-flash': (2.2, 0.0065),
+        'gpt-4o-audio-preview': (2.5, 0.03),
+        'gemini-1.5-pro': (3.5, 0.008),
+    }
+    DEFAULT_PRIOR = (3.0, 0.01)
+
+    def __init__(self, latency_budget=3.0, optimize='quality', alpha=0.2, max_error_rate=0.5,
+                 stale_seconds=120, costs=None):
+        self.latency_budget = latency_budget
+        self.optimize = optimize
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.stale_seconds = stale_seconds
+        self.costs = costs or {}
+        self.stats = {}  # model -> {'latency': [per bucket], 'errors', 'cost', 'updated'}
+        self.lock = threading.Lock()
+        self.last_route = None
+
+    def bucket(self, duration):
+        return sum(duration > edge for edge in self.LENGTH_BUCKETS)
+
+    def cost_per_minute(self, model):
+        return self.costs.get(model, self.PRIORS.get(model, self.DEFAULT_PRIOR)[1])
+
+    def model_stats(self, model):
+        """A model's stats, reset to its priors if they have gone stale"""
+        stats = self.stats.get(model)
+        if stats is None or time.monotonic() - stats['updated'] > self.stale_seconds:
+            prior_latency = self.PRIORS.get(model, self.DEFAULT_PRIOR)[0]
+            # Scale the prior to the middle of each length bucket
+            latencies = [prior_latency * scale for scale in (0.6, 1.0, 1.8)]
+            stats = self.stats[model] = {'latency': latencies, 'errors': 0.0, 'cost': None,
+                                         'updated': time.monotonic()}
+        return stats
+
+    def choose(self, duration, candidates):
+        """Pick a model from ``candidates`` (best first) for a segment; returns (model, estimate, reason)"""
+        with self.lock:
+            estimates = []
+            for model in candidates:
+                stats = self.model_stats(model)
+                if stats['errors'] > self.max_error_rate:
+                    continue
+                estimates.append((model, stats['latency'][self.bucket(duration)]))
+        if not estimates:
+            # Everything is failing: take the preferred model and let its breaker decide
+            return candidates[0], None, "all routes failing"
+        
+        within_budget = [item for item in estimates if item[1] <= self.latency_budget]
+        if not within_budget:
+            model, estimate = min(estimates, key=lambda item: item[1])
+            return model, estimate, "fastest, none within budget"
+        if self.optimize == 'cost':
+            model, estimate = min(within_budget, key=lambda item: self.cost_per_minute(item[0]))
+            return model, estimate, "cheapest within budget"
+        if self.optimize == 'latency':
+            model, estimate = min(within_budget, key=lambda item: item[1])
+            return model, estimate, "fastest"
+        model, estimate = within_budget[0]
+        return model, estimate, "preferred within budget"
+
+    def record(self, model, duration, latency, success):
+        """Fold a finished segment into the model's averages"""
+        with self.lock:
+            stats = self.model_stats(model)
+            stats['errors'] += self.alpha * ((0.0 if success else 1.0) - stats['errors'])
+            if success:
+                bucket = self.bucket(duration)
+                stats['latency'][bucket] += self.alpha * (latency - stats['latency'][bucket])
+                cost = self.cost_per_minute(model) * duration / 60
+                stats['cost'] = cost if stats['cost'] is None else stats['cost'] + self.alpha * (cost - stats['cost'])
+            stats['updated'] = time.monotonic()
+
+    def summary(self):
+        """One line per model that has handled segments"""
+        with self.lock:
+            lines = []
+            for model, stats in self.stats.items():
+                if stats['cost'] is None and not stats['errors']:
+                    continue
+                latencies = ' / '.join(f"{value:.1f}" for value in stats['latency'])
+                cost = f"${stats['cost']:.4f}" if stats['cost'] is not None else "n/a"
+                lines.append(f"{model}: latency {latencies}s (short/medium/long), "
+                             f"errors {stats['errors']:.0%}, cost {cost}/segment")
+            return lines
+
+
+class TokenBucket:
+    """Refills at a per-minute rate; reservations may overdraw it and wait off the debt"""
+
+    def __init__(self, per_minute, burst_seconds=15):
+        self.per_minute = per_minute
+        self.burst_seconds = burst_seconds
+        self.share = 1.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self):
+        return self.per_minute * self.share / 60
+
+    @property
+    def capacity(self):
+        return max(1.0, self.rate * self.burst_seconds)
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until ``amount`` could be taken"""
+        self.refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def reserve(self, amount):
+        self.tokens -= amount
+
+
+class SessionRegistry:
+    """Counts running sessions that share an API key, through a small SQLite file"""
+
+    def __init__(self, path, ttl_seconds=30):
+        self.ttl_seconds = ttl_seconds
+        self.session_id = f"{os.getpid()}-{id(self):x}"
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                        "(session TEXT, key TEXT, seen REAL, PRIMARY KEY (session, key))")
+        self.db.commit()
+        self.lock = threading.Lock()
+
+    def active_sessions(self, key_id):
+        """Record this session as alive and count the live sessions using ``key_id``"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO sessions (session, key, seen) VALUES (?, ?, ?)",
+                            (self.session_id, key_id, now))
+            self.db.execute("DELETE FROM sessions WHERE seen < ?", (now - self.ttl_seconds,))
+            self.db.commit()
+            count, = self.db.execute("SELECT COUNT(*) FROM sessions WHERE key = ?", (key_id,)).fetchone()
+        return max(1, count)
+
+    def leave(self):
+        with self.lock:
+            self.db.execute("DELETE FROM sessions WHERE session = ?", (self.session_id,))
+            self.db.commit()
+            self.db.close()
+
+
+# Requests/tokens per minute by provider or model, used until rate_limits is configured
+DEFAULT_RATE_LIMITS = {
+    'gpt-4o-audio-preview': {'rpm': 500, 'tpm': 30000},
+    'gpt-4o-mini': {'rpm': 500, 'tpm': 200000},
+    'whisper-1': {'rpm': 500},
+    'gemini': {'rpm': 15, 'tpm': 1000000}
+}
+
+
+class RateLimitScheduler:
+    """Request and token quotas as token buckets, per provider and per model
+
+    ``limits`` maps a provider (``openai``, ``gemini``) or model name to
+    ``{'rpm': ..., 'tpm': ...}``. A segment's planned requests are checked
+    against every bucket they touch and reserved together, so a segment
+    either fits within ``max_wait`` or leaves the buckets untouched. With a
+    session registry, each provider's quota is split evenly between the
+    running sessions that use the same API key.
+    """
+
+    SHARE_REFRESH_SECONDS = 10
+
+    def __init__(self, limits, registry=None):
+        self.limits = limits or {}
+        self.registry = registry
+        self.buckets = {}  # (provider, name, 'rpm' or 'tpm') -> TokenBucket
+        self.key_ids = {}  # provider -> hashed API key
+        self.shares_updated = 0.0
+        self.lock = threading.Lock()
+
+    def set_api_key(self, provider, api_key):
+        self.key_ids[provider] = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else None
+        self.shares_updated = 0.0
+
+    def buckets_for(self, provider, model):
+        buckets = []
+        for name in (provider, model):
+            for kind, per_minute in self.limits.get(name, {}).items():
+                if per_minute <= 0:
+                    continue
+                key = (provider, name, kind)
+                if key not in self.buckets:
+                    self.buckets[key] = TokenBucket(per_minute)
+                buckets.append((self.buckets[key], kind))
+        return buckets
+
+    def refresh_shares(self):
+        """Re-split quotas if the number of sessions sharing a key changed"""
+        if not self.registry or time.monotonic() - self.shares_updated < self.SHARE_REFRESH_SECONDS:
+            return
+        self.shares_updated = time.monotonic()
+        # The registry is a SQLite file; callers (the asyncio engine's event loop too) never wait on it
+        threading.Thread(target=self.apply_shares, daemon=True).start()
+
+    def apply_shares(self):
+        """Count the sessions on each key and set the buckets' shares (on its own thread)"""
+        for provider, key_id in list(self.key_ids.items()):
+            try:
+                share = 1.0 / self.registry.active_sessions(key_id) if key_id else 1.0
+            except sqlite3.Error as e:
+                print(f"Session registry unavailable: {e}")
+                return
+            with self.lock:
+                for (bucket_provider, _, _), bucket in self.buckets.items():
+                    if bucket_provider == provider:
+                        bucket.refill()
+                        bucket.share = share
+
+    def reserve(self, requests, max_wait=None):
+        """Reserve quota for [(provider, model, tokens)] requests
+
+        Returns the seconds to wait before sending, or None (nothing
+        reserved) if that would be longer than ``max_wait``.
+        """
+        self.refresh_shares()
+        with self.lock:
+            amounts = collections.defaultdict(float)
+            for provider, model, tokens in requests:
+                for bucket, kind in self.buckets_for(provider, model):
+                    amounts[bucket] += 1 if kind == 'rpm' else tokens
+            wait = max((bucket.wait_time(amount) for bucket, amount in amounts.items()), default=0.0)
+            if max_wait is not None and wait > max_wait:
+                return None
+            for bucket, amount in amounts.items():
+                bucket.reserve(amount)
+            return wait
+
+    def sustainable_rate(self, requests):
+        """How many times per second the quotas allow sending [(provider, model, tokens)] (inf if unlimited)"""
+        with self.lock:
+            amounts = collections.defaultdict(float)
+            for provider, model, tokens in requests:
+                for bucket, kind in self.buckets_for(provider, model):
+                    amounts[bucket] += 1 if kind == 'rpm' else tokens
+            return min((bucket.rate / amount for bucket, amount in amounts.items() if amount > 0),
+                       default=float('inf'))
+
+
+class LocalWhisperASR:
+    """Offline speech recognition with faster-whisper (CTranslate2, int8 on CPU)
+
+    The model is loaded on first use and stays resident for later segments.
+    Calls are serialized: one CTranslate2 model already spreads a call over
+    all the CPU threads it is given.
+    """
+
+    def __init__(self, model_size='small', compute_type='int8', cpu_threads=0, beam_size=1):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.beam_size = beam_size
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Load the model if it isn't loaded yet (call with the lock held or from one thread)"""
+        if self.model is None:
+            try:
+                from faster_whisper import WhisperModel
+            except ImportError:
+                raise RuntimeError("Local speech recognition needs faster-whisper: pip install -r requirements-offline.txt")
+            print(f"Loading local Whisper model '{self.model_size}' ({self.compute_type})...")
+            started = time.monotonic()
+            self.model = WhisperModel(self.model_size, device='cpu', compute_type=self.compute_type,
+                                      cpu_threads=self.cpu_threads)
+            print(f"Local Whisper model loaded in {time.monotonic() - started:.1f}s")
+        return self.model
+
+    def preload(self):
+        with self.lock:
+            self.load()
+
+    def transcribe(self, samples):
+        """Transcribe 16 kHz int16 samples; returns (text, language, language probability 0-100)"""
+        audio = samples.astype(np.float32) / 32768.0
+        with self.lock:
+            model = self.load()
+            segments, info = model.transcribe(audio, beam_size=self.beam_size,
+                                              condition_on_previous_text=False)
+            # segments is a generator; decoding happens while it is consumed
+            text = ''.join(segment.text for segment in segments).strip()
+        return text, info.language, int(round(100 * info.language_probability))
+
+
+class LocalTranslator:
+    """Offline text translation with an NLLB-200 model converted for CTranslate2
+
+    Languages are given by English name, as in the target-language list.
+    The model is loaded on first use, warmed up with one short sentence and
+    stays resident; a whole batch of transcripts goes through in one call.
+    """
+
+    # NLLB-200 language tokens by language name
+    LANGUAGE_CODES = {
+        'english': 'eng_Latn', 'nepali': 'npi_Deva', 'hindi': 'hin_Deva', 'spanish': 'spa_Latn',
+        'french': 'fra_Latn', 'german': 'deu_Latn', 'chinese': 'zho_Hans', 'japanese': 'jpn_Jpan',
+        'korean': 'kor_Hang', 'thai': 'tha_Thai', 'indonesian': 'ind_Latn', 'vietnamese': 'vie_Latn',
+        'arabic': 'arb_Arab', 'russian': 'rus_Cyrl', 'portuguese': 'por_Latn', 'italian': 'ita_Latn',
+        'dutch': 'nld_Latn', 'polish': 'pol_Latn', 'turkish': 'tur_Latn', 'swedish': 'swe_Latn',
+        'danish': 'dan_Latn', 'norwegian': 'nob_Latn', 'finnish': 'fin_Latn', 'hebrew': 'heb_Hebr',
+        'czech': 'ces_Latn', 'hungarian': 'hun_Latn', 'romanian': 'ron_Latn', 'bulgarian': 'bul_Cyrl',
+        'croatian': 'hrv_Latn', 'slovak': 'slk_Latn', 'slovenian': 'slv_Latn', 'estonian': 'est_Latn',
+        'latvian': 'lvs_Latn', 'lithuanian': 'lit_Latn', 'ukrainian': 'ukr_Cyrl', 'belarusian': 'bel_Cyrl',
+        'macedonian': 'mkd_Cyrl', 'albanian': 'als_Latn', 'serbian': 'srp_Cyrl', 'bosnian': 'bos_Latn',
+        'icelandic': 'isl_Latn', 'irish': 'gle_Latn', 'welsh': 'cym_Latn', 'maltese': 'mlt_Latn',
+        'basque': 'eus_Latn', 'catalan': 'cat_Latn', 'galician': 'glg_Latn', 'bengali': 'ben_Beng',
+        'urdu': 'urd_Arab', 'tamil': 'tam_Taml', 'malay': 'zsm_Latn', 'filipino': 'tgl_Latn',
+        'persian': 'pes_Arab', 'greek': 'ell_Grek',
+    }
+
+    def __init__(self, model_path, compute_type='int8', cpu_threads=0, beam_size=2, max_batch_size=16):
+        self.model_path = model_path
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.beam_size = beam_size
+        self.max_batch_size = max_batch_size
+        self.translator = None
+        self.tokenizer = None
+        self.lock = threading.Lock()
+
+    def language_code(self, language):
+        """NLLB token for a language name, or None if the model doesn't know it"""
+        return self.LANGUAGE_CODES.get(str(language).strip().lower())
+
+    def load(self):
+        """Load and warm up the model if it isn't loaded yet (call with the lock held or from one thread)"""
+        if self.translator is None:
+            try:
+                import ctranslate2
+                import sentencepiece
+            except ImportError:
+                raise RuntimeError("Local translation needs ctranslate2 and sentencepiece: "
+                                   "pip install -r requirements-offline.txt")
+            print(f"Loading local translation model '{self.model_path}' ({self.compute_type})...")
+            started = time.monotonic()
+            translator = ctranslate2.Translator(self.model_path, device='cpu', compute_type=self.compute_type,
+                                                intra_threads=self.cpu_threads)
+            self.tokenizer = sentencepiece.SentencePieceProcessor(
+                model_file=os.path.join(self.model_path, 'sentencepiece.bpe.model'))
+            # The first call allocates buffers; pay for it before the first real segment
+            translator.translate_batch([['eng_Latn'] + self.tokenizer.encode('Hello', out_type=str) + ['</s>']],
+                                       target_prefix=[['fra_Latn']], beam_size=1, max_decoding_length=8)
+            self.translator = translator
+            print(f"Local translation model loaded in {time.monotonic() - started:.1f}s")
+        return self.translator
+
+    def preload(self):
+        with self.lock:
+            self.load()
+
+    def translate(self, texts, source_languages, target_language):
+        """Translate texts (with their source language names) in one batch; returns the translations"""
+        target_code = self.language_code(target_language)
+        if not target_code:
+            raise ValueError(f"Local translation does not support {target_language}")
+
+        results = list(texts)
+        batch = []
+        for index, (text, source_language) in enumerate(zip(texts, source_languages)):
+            source_code = self.language_code(source_language)
+            if source_code != target_code and text.strip():
+                # Unknown sources still translate; NLLB's encoder mostly ignores the source token
+                batch.append((index, source_code or 'eng_Latn', text))
+        if not batch:
+            return results
+
+        with self.lock:
+            translator = self.load()
+            tokens = [[source_code] + self.tokenizer.encode(text, out_type=str) + ['</s>']
+                      for _, source_code, text in batch]
+            outputs = translator.translate_batch(tokens, target_prefix=[[target_code]] * len(batch),
+                                                 beam_size=self.beam_size, max_batch_size=self.max_batch_size)
+            for (index, _, _), output in zip(batch, outputs):
+                # Drop the target-language token the output starts with
+                results[index] = self.tokenizer.decode(output.hypotheses[0][1:]).strip()
+        return results
+
+
+class RealtimeSession:
+    """A streaming speech session over the OpenAI Realtime WebSocket API
+
+    Audio is pushed with ``send_audio`` from the capture thread as it is
+    recorded, and server events go to ``on_event(event)`` on the session's own
+    event loop thread. When the connection drops, the session calls
+    ``on_reset()`` so unfinished turns can be abandoned. It then reconnects with
+    backoff and replays their audio (at most ``resume_seconds``) into the new
+    session, so speech spoken across a reconnect is not lost. A turn's audio
+    is kept until ``finish_turn`` is called for it.
+    """
+
+    SAMPLE_RATE = 24000  # The API takes 24 kHz mono pcm16
+
+    def __init__(self, url, headers, session_config, on_event, on_reset, sample_rate=16000,
+                 resume_seconds=10, retry_delay=None):
+        self.url = url
+        self.headers = headers
+        self.session_config = session_config
+        self.on_event = on_event
+        self.on_reset = on_reset
+        self.sample_rate = sample_rate
+        self.max_replay = int(resume_seconds * self.SAMPLE_RATE)
+        self.retry_delay = retry_delay or (lambda attempt: min(8.0, 0.5 * 2 ** attempt))
+        self.history = collections.deque()  # (position, samples, base64 pcm16) of recent audio
+        self.position = 0  # 24 kHz samples captured so far
+        self.idle_position = 0  # Audio before this belongs to finished turns
+        self.open_turns = {}  # item_id -> position where its speech started
+        self.session_start = 0  # Position the server's audio_start_ms/audio_end_ms count from
+        self.connection = None
+        self.reconnects = 0
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+
+    def start(self):
+        """Start the session thread; it connects (and reconnects) in the background"""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.audio_ready = asyncio.Event()
+        self.main_task = self.loop.create_task(self.maintain())
+        self.ready.set()
+        try:
+            self.loop.run_until_complete(self.main_task)
+        except asyncio.CancelledError:
+            pass  # Cancelled by stop()
+        finally:
+            self.loop.close()
+
+    def stop(self):
+        """Close the connection and end the session thread"""
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.main_task.cancel)
+            self.thread.join(timeout=5)
+
+    def send_audio(self, samples):
+        """Queue captured int16 samples for streaming (safe from any thread)"""
+        if self.sample_rate != self.SAMPLE_RATE:
+            count = int(len(samples) * self.SAMPLE_RATE / self.sample_rate)
+            samples = np.interp(np.arange(count) * (self.sample_rate / self.SAMPLE_RATE),
+                                np.arange(len(samples)), samples).astype(np.int16)
+        chunk = base64.b64encode(np.ascontiguousarray(samples, dtype=np.int16).tobytes()).decode('ascii')
+        try:
+            self.loop.call_soon_threadsafe(self.append_audio, len(samples), chunk)
+        except RuntimeError:
+            pass  # The session's loop has closed; there is nothing left to stream to
+
+    def append_audio(self, count, chunk):
+        self.history.append((self.position, count, chunk))
+        self.position += count
+        # Keep only what a reconnect may have to replay
+        keep_from = self.replay_position()
+        while len(self.history) > 1 and self.history[1][0] <= keep_from:
+            self.history.popleft()
+        self.audio_ready.set()
+
+    def replay_position(self):
+        """Where a new session should start: the oldest unfinished turn, within resume_seconds"""
+        start = min(self.open_turns.values()) if self.open_turns else self.idle_position
+        return max(start, self.position - self.max_replay)
+
+    def finish_turn(self, item_id):
+        """Mark a turn as answered so its audio no longer needs to be kept"""
+        self.open_turns.pop(item_id, None)
+
+    def send_event(self, event):
+        """Send a client event on the current connection (session thread only)"""
+        if self.connection:
+            task = self.loop.create_task(self.connection.send(json.dumps(event)))
+            # A send that races a dropped connection doesn't matter; the next session starts afresh
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def maintain(self):
+        try:
+            import websockets
+            from websockets.asyncio.client import connect
+        except ImportError:
+            print("The Realtime provider needs websockets: pip install -r requirements-realtime.txt")
+            return
+
+        attempt = 0
+        while True:
+            try:
+                async with connect(self.url, additional_headers=self.headers, max_size=None,
+                                   close_timeout=1) as connection:
+                    self.connection = connection
+                    attempt = 0
+                    await self.serve(connection)
+                print("Realtime session closed by the server")
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                print(f"Realtime connection lost: {e}")
+            finally:
+                self.connection = None
+
+            # Unfinished turns start over in the next session from their first sample
+            self.idle_position = self.replay_position()
+            self.open_turns.clear()
+            self.on_reset()
+            delay = self.retry_delay(attempt)
+            attempt += 1
+            self.reconnects += 1
+            print(f"Reconnecting to the Realtime API in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def serve(self, connection):
+        """Configure a fresh server session, replay unfinished audio, then stream and receive"""
+        await connection.send(json.dumps({'type': 'session.update', 'session': self.session_config}))
+        target = self.replay_position()
+        self.session_start = next((start for start, _, _ in reversed(self.history) if start <= target), target)
+        self.idle_position = self.session_start
+        sender = asyncio.ensure_future(self.stream_audio(connection))
+        try:
+            async for message in connection:
+                event = json.loads(message)
+                self.track(event)
+                self.on_event(event)
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+
+    async def stream_audio(self, connection):
+        """Send buffered audio from the session start, then new audio as it is captured"""
+        sent = self.session_start
+        while True:
+            # Audio appended from here on sets the event again
+            self.audio_ready.clear()
+            for start, count, chunk in [item for item in self.history if item[0] >= sent]:
+                await connection.send(json.dumps({'type': 'input_audio_buffer.append', 'audio': chunk}))
+                sent = start + count
+            await self.audio_ready.wait()
+
+    def track(self, event):
+        """Follow turn boundaries so a reconnect knows which audio to replay"""
+        samples_per_ms = self.SAMPLE_RATE // 1000
+        if event.get('type') == 'input_audio_buffer.speech_started':
+            self.open_turns[event['item_id']] = self.session_start + event.get('audio_start_ms', 0) * samples_per_ms
+        elif event.get('type') == 'input_audio_buffer.speech_stopped':
+            end = self.session_start + event.get('audio_end_ms', 0) * samples_per_ms
+            self.idle_position = max(self.idle_position, end)
+
+
+class QueuedSegment:
+    """A captured segment waiting for translation"""
+
+    __slots__ = ('sequence', 'audio', 'enqueued_at', 'model', 'source')
+
+    def __init__(self, sequence, audio, enqueued_at, model=None, source=None):
+        self.sequence = sequence
+        self.audio = audio
+        self.enqueued_at = enqueued_at
+        self.model = model  # Overrides the selected model (e.g. when degraded)
+        self.source = source  # (ring, start position) while audio is a view into an AudioRingBuffer
+
+
+class LatencyBoundedQueue:
+    """Bounded FIFO of QueuedSegments that enforces a latency budget.
+
+    When the queue is full, or the oldest segment has waited longer than
+    ``latency_budget`` seconds, the overload ``policy`` decides what happens:
+
+    - ``drop_oldest``: discard stale segments (a late translation is worse than none)
+    - ``merge``: join adjacent queued segments into one request
+    - ``degrade``: keep everything but translate stale segments with ``degraded_model``,
+      or drop them like ``drop_oldest`` while ``model_usable(degraded_model)`` is false
+
+    Segments that disappear are reported through ``on_drop(sequence)`` so the
+    in-order display never waits for them. Segments queued as ring-buffer views
+    are copied out when they leave the queue; one the ring has overwritten
+    while it waited is dropped rather than sent with the wrong audio.
+    """
+
+    def __init__(self, maxsize, latency_budget, policy='drop_oldest', degraded_model=None,
+                 max_merged_samples=None, on_drop=None, model_usable=None):
+        self.maxsize = max(1, int(maxsize))
+        self.latency_budget = latency_budget
+        self.policy = policy
+        self.degraded_model = degraded_model
+        self.max_merged_samples = max_merged_samples
+        self.on_drop = on_drop
+        self.model_usable = model_usable
+        self.items = collections.deque()
+        self.pending_drops = []  # Sequences absorbed by merges, reported outside the lock
+        self.condition = threading.Condition()
+        self.metrics = {'max_depth': 0, 'last_wait': 0.0, 'max_wait': 0.0,
+                        'dropped': 0, 'merged': 0, 'degraded': 0}
+
+    def qsize(self):
+        return len(self.items)
+
+    def oldest_age(self):
+        """Seconds the oldest queued segment has been waiting"""
+        with self.condition:
+            if not self.items:
+                return 0.0
+            return time.monotonic() - self.items[0].enqueued_at
+
+    def put(self, sequence, audio, source=None):
+        dropped = []
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                if self.policy == 'merge' and len(self.items) >= 2 and self.merge_head(2):
+                    pass
+                else:
+                    dropped.append(self.items.popleft().sequence)
+                    self.metrics['dropped'] += 1
+            self.items.append(QueuedSegment(sequence, audio, time.monotonic(), source=source))
+            self.metrics['max_depth'] = max(self.metrics['max_depth'], len(self.items))
+            self.condition.notify()
+        self.report_drops(dropped)
+
+    def get(self, timeout=None):
+        """Return the next segment, applying the overload policy to stale ones
+
+        Raises queue.Empty if nothing arrives within ``timeout`` seconds.
+        """
+        dropped = []
+        try:
+            return self.next_segment(timeout, dropped)
+        finally:
+            self.report_drops(dropped)
+
+    def next_segment(self, timeout, dropped):
+        with self.condition:
+            while True:
+                if not self.condition.wait_for(lambda: self.items, timeout):
+                    raise queue.Empty
+                now = time.monotonic()
+                stale = now - self.items[0].enqueued_at > self.latency_budget
+                policy = self.policy
+                if policy == 'degrade' and not self.can_degrade():
+                    policy = 'drop_oldest'  # A degraded model without a configured client would only fail
+                if stale and policy == 'drop_oldest':
+                    while self.items and now - self.items[0].enqueued_at > self.latency_budget:
+                        dropped.append(self.items.popleft().sequence)
+                        self.metrics['dropped'] += 1
+                    if not self.items:
+                        continue
+                elif stale and policy == 'merge':
+                    self.merge_head(len(self.items))
+                elif stale and policy == 'degrade':
+                    self.items[0].model = self.degraded_model
+                    self.metrics['degraded'] += 1
+                
+                segment = self.items.popleft()
+                if not self.detach(segment):
+                    dropped.append(segment.sequence)
+                    continue
+                wait = now - segment.enqueued_at
+                self.metrics['last_wait'] = wait
+                self.metrics['max_wait'] = max(self.metrics['max_wait'], wait)
+                return segment
+
+    def can_degrade(self):
+        return bool(self.degraded_model) and (self.model_usable is None or self.model_usable(self.degraded_model))
+
+    def detach(self, segment):
+        """Replace a segment's ring view with a copy; False if the ring already overwrote it"""
+        if segment.source is None:
+            return True
+        ring, position = segment.source
+        segment.source = None
+        audio = ring.copy(position, len(segment.audio))
+        if audio is None:
+            return False
+        segment.audio = audio
+        return True
+
+    def merge_head(self, count):
+        """Merge up to ``count`` segments at the head into one; caller holds the lock"""
+        merged = [self.items.popleft()]
+        total = len(merged[0].audio)
+        while len(merged) < count and self.items:
+            if self.max_merged_samples and total + len(self.items[0].audio) > self.max_merged_samples:
+                break
+            merged.append(self.items.popleft())
+            total += len(merged[-1].audio)
+        
+        valid = []
+        for segment in merged:
+            if self.detach(segment):
+                valid.append(segment)
+            else:
+                self.pending_drops.append(segment.sequence)  # Overwritten by the ring while queued
+        
+        if valid:
+            head = valid[0]
+            if len(valid) > 1:
+                head.audio = np.concatenate([segment.audio for segment in valid])
+                self.metrics['merged'] += len(valid) - 1
+            self.items.appendleft(head)
+            # The merged-away sequences are translated as part of the head
+            self.pending_drops.extend(segment.sequence for segment in valid[1:])
+        return len(merged) > len(valid[:1])
+
+    def report_drops(self, dropped):
+        with self.condition:
+            # Swap the list out under the lock so a concurrent merge never lands in a cleared list
+            pending, self.pending_drops = self.pending_drops, []
+        dropped.extend(pending)
+        if self.on_drop:
+            for sequence in dropped:
+                self.on_drop(sequence)
+
+
+class AsyncPipelineEngine:
+    """Runs encoding, provider calls and display dispatch on an asyncio loop.
+
+    The loop lives in one dedicated thread. Segments are taken from the app's
+    audio queue as soon as a concurrency slot frees up and translated through
+    the app's async provider methods, bounded by a semaphore, so many requests
+    can be in flight without one OS thread each.
+    """
+
+    def __init__(self, app, max_concurrency=16, mt_concurrency=2):
+        self.app = app
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.mt_concurrency = max(1, int(mt_concurrency))
+        self.loop = None
+        self.tasks = set()
+        self.ready = threading.Event()
+
+    def start(self):
+        """Start the event loop thread and wait until it accepts segments"""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.mt_semaphore = asyncio.Semaphore(self.mt_concurrency)
+        self.mt_batches = {}  # (target, model) -> ([(sequence, transcript, future)], flush timer)
+        self.asr_in_flight = 0  # Transcriptions running whose transcripts could still join a batch
+        self.reorder_buffer = SequenceReorderBuffer()
+        self.dispatch_task = self.loop.create_task(self.dispatch())
+        self.ready.set()
+        try:
+            self.loop.run_until_complete(self.dispatch_task)
+        except asyncio.CancelledError:
+            pass  # Cancelled by stop()
+        finally:
+            self.loop.run_until_complete(asyncio.gather(*self.tasks, return_exceptions=True))
+            self.loop.run_until_complete(self.app.async_http_client.aclose())
+            self.loop.close()
+
+    def deliver(self, sequence, translation):
+        """Hand a finished (or dropped) segment to the loop (safe from any thread)"""
+        self.loop.call_soon_threadsafe(self.release, sequence, translation)
+
+    def release(self, sequence, translation):
+        for ready_sequence, ready in self.reorder_buffer.add(sequence, (sequence, translation)):
+            self.app.show_final_translation(ready_sequence, ready)
+
+    def stop(self):
+        """Cancel in-flight work and shut the loop down"""
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.cancel_all)
+
+    def cancel_all(self):
+        self.dispatch_task.cancel()
+        for task in self.tasks:
+            task.cancel()
+
+    async def dispatch(self):
+        while True:
+            # Only take a segment once a slot is free so overload policies still apply
+            await self.semaphore.acquire()
+            segment = None
+            while segment is None:
+                segment = await self.loop.run_in_executor(None, self.next_segment)
+            task = self.loop.create_task(self.process(segment))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def next_segment(self):
+        try:
+            return self.app.audio_queue.get(timeout=0.5)
+        except queue.Empty:
+            return None
+
+    async def translate_transcript(self, sequence, transcript, target_lang, model):
+        """Add a transcript to the pending MT batch; returns (translation, seconds its batch took)"""
+        future = self.loop.create_future()
+        key = (target_lang, model)
+        if key not in self.mt_batches:
+            window = self.app.config.get('mt_batch_window_ms', 25) / 1000
+            self.mt_batches[key] = ([], self.loop.call_later(window, self.flush_batch, key))
+        batch = self.mt_batches[key][0]
+        batch.append((sequence, transcript, future))
+        # With no transcription running nothing else can join soon, so don't wait out the window
+        if len(batch) >= max(1, int(self.app.config.get('mt_batch_size', 8))) or not self.asr_in_flight:
+            self.flush_batch(key)
+        return await future
+
+    def flush_batch(self, key):
+        batch, timer = self.mt_batches.pop(key)
+        timer.cancel()
+        task = self.loop.create_task(self.translate_batch(key, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def translate_batch(self, key, batch):
+        target_lang, model = key
+        try:
+            async with self.mt_semaphore:
+                started = time.monotonic()
+                if len(batch) == 1:
+                    sequence, transcript, _ = batch[0]
+                    translations = [await self.app.atranslate_transcript(
+                        transcript, target_lang, model, self.app.make_partial_callback(sequence))]
+                else:
+                    translations = await self.app.atranslate_transcript_batch(
+                        [transcript for _, transcript, _ in batch], target_lang, model)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        seconds = time.monotonic() - started
+        for (_, _, future), translation in zip(batch, translations):
+            if not future.done():
+                future.set_result((translation, seconds))
+
+    async def process(self, segment):
+        translation = None
+        slot_held = True
+        try:
+            if self.app.is_translating:
+                app = self.app
+                target_lang = app.config.get('target_language', 'English')
+                selected_model = app.select_segment_model(segment, target_lang)
+                # Hashing the spectrum and scanning the index are CPU work; keep them off the event loop
+                fingerprint = await self.loop.run_in_executor(None, app.audio_fingerprints.fingerprint, segment.audio)
+                translation = await self.loop.run_in_executor(None, app.audio_fingerprints.get,
+                                                              fingerprint, selected_model, target_lang)
+                if translation is None:
+                    selected_model, wait = app.schedule_segment(selected_model, segment.audio)
+                    await asyncio.sleep(wait)
+                    started = time.monotonic()  # Service time only: quota waits are not the backend's latency
+                    app.update_processing_status(1)
+                    try:
+                        if app.config.get('pipeline_two_stage', True) and app.is_two_stage_model(selected_model):
+                            self.asr_in_flight += 1
+                            try:
+                                transcript = await app.atranscribe_segment(segment.audio, selected_model)
+                            finally:
+                                self.asr_in_flight -= 1
+                                if not self.asr_in_flight:
+                                    for key in list(self.mt_batches):
+                                        self.flush_batch(key)
+                            service_seconds = time.monotonic() - started
+                            if transcript:
+                                # Free the ASR slot so the next segment can be transcribed meanwhile
+                                self.semaphore.release()
+                                slot_held = False
+                                translation, mt_seconds = await self.translate_transcript(
+                                    segment.sequence, transcript, target_lang, selected_model)
+                                service_seconds += mt_seconds
+                        else:
+                            translation = await app.atranslate_audio(segment.audio, selected_model,
+                                                                     app.make_partial_callback(segment.sequence))
+                            service_seconds = time.monotonic() - started
+                        app.remember_segment(fingerprint, selected_model, target_lang, translation)
+                        app.record_route(selected_model, segment.audio, service_seconds, True)
+                    except Exception:
+                        app.record_route(selected_model, segment.audio, time.monotonic() - started, False)
+                        raise
+                    finally:
+                        app.update_processing_status(-1)
+                
+                translation = app.timestamp_translation(translation)
+            
+        except Exception as e:
+            print(f"Error processing audio: {e}")
+            translation = self.app.timestamp_translation(self.app.error_message(e))
+        finally:
+            if slot_held:
+                self.semaphore.release()
+            self.release(segment.sequence, translation)
+
+
 class RealtimeVoiceTranslator:
     def __init__(self):
         self.setup_config()
         self.setup_audio()
+        self.setup_encoders()
+        self.language_detector = LocalLanguageDetector()
+        self.setup_translation_cache()
+        self.local_asr = LocalWhisperASR(
+            self.config.get('local_asr_model', 'small'),
+            self.config.get('local_asr_compute_type', 'int8'),
+            self.config.get('local_asr_threads', 0),
+            self.config.get('local_asr_beam_size', 1)
+        )
+        self.local_translator = LocalTranslator(
+            self.config.get('local_mt_model_path', 'nllb-200-distilled-600M-ct2-int8'),
+            self.config.get('local_mt_compute_type', 'int8'),
+            self.config.get('local_mt_threads', 0),
+            self.config.get('local_mt_beam_size', 2),
+            self.config.get('local_mt_max_batch_size', 16)
+        )
+        self.setup_http_transport()
+        self.setup_fault_tolerance()
+        self.setup_rate_limits()
+        self.model_router = ModelRouter(
+            self.config.get('router_latency_budget_seconds', 3),
+            self.config.get('router_optimize', 'quality'),
+            costs=self.config.get('router_costs_per_minute')
+        )
         self.setup_openai()
         self.setup_gemini()
         self.setup_gui()
         
+        # Audio settings
+        self.chunk_size = 1024
+        self.sample_rate = 16000
+        self.channels = 1
+        self.audio_format = pyaudio.paInt16
+        self.record_seconds = 5  # Process audio every 5 seconds
+        self.ring_buffer = None  # Created per capture session
+        self.segmenter = None
+        self.segment_controller = None  # Adapts segment length; created per capture session
+        self.noise_floor = None
+        self.upload_bytes_saved = 0
+        self.audio_fingerprints = AudioFingerprintIndex(
+            self.sample_rate,
+            self.config.get('audio_fingerprint_cache_size', 64),
+            self.config.get('audio_fingerprint_max_bit_error', 0.33)
+        )
+        
         # Threading
-        self.audio_queue = queue.Queue()
-        self.translation_queue = queue.Queue()
+        self.audio_queue = LatencyBoundedQueue(
+            self.config.get('max_queue_size', 8),
+            self.config.get('queue_latency_budget_seconds', 6),
+            policy=self.config.get('queue_overload_policy', 'drop_oldest'),
+            degraded_model=self.config.get('degraded_audio_model', 'whisper-1'),
+            max_merged_samples=int(self.sample_rate * self.config.get('max_merged_segment_seconds', 20)),
+            on_drop=lambda sequence: self.report_translation(sequence, None),
+            # Keys can change while running, so check the degraded model's client when it is needed
+            model_usable=lambda model: not self.missing_api_keys(model)
+        )
+        self.transcript_queue = queue.Queue()  # (sequence, (text, language, confidence), target, model, fingerprint, (audio, ASR seconds))
+        self.translation_queue = queue.Queue()  # (sequence, translation or None)
+        self.sliding_windows = queue.Queue()  # (start, end, speech continues) ring windows, None to stop
+        self.segment_counter = itertools.count()
+        self.processing_lock = threading.Lock()
+        self.processing_count = 0
+        self.asr_in_flight = 0  # Two-stage segments being transcribed, whose transcripts may join an MT batch
+        self.async_engine = None
+        self.realtime_session = None
         self.is_recording = False
         self.is_translating = False
         
@@ -31,13 +1976,6 @@ class RealtimeVoiceTranslator:
         self.minimized_window = None
         self.is_minimized = False
         
-        # Audio settings
-        self.chunk_size = 1024
-        self.sample_rate = 16000
-        self.channels = 1
-        self.audio_format = pyaudio.paInt16
-        self.record_seconds = 5  # Process audio every 5 seconds
-        
         # Start background processing
         self.start_background_threads()
         
@@ -60,7 +1998,85 @@ class RealtimeVoiceTranslator:
                 'translation_model': 'gpt-4o-audio-preview',
                 'selected_audio_model': 'gpt-4o-audio-preview',
                 'enable_minimized': False,
-                'always_on_top': True
+                'always_on_top': True,
+                'ring_buffer_seconds': 30,  # Capture history kept in memory
+                'segmentation_mode': 'vad',  # 'vad', 'fixed' (record_seconds windows) or 'sliding' (live captions)
+                'sliding_window_seconds': 6,  # Audio each overlapping window covers
+                'sliding_hop_seconds': 1.5,  # How often a new window is transcribed
+                'sliding_max_caption_seconds': 20,  # Longest caption before it is closed mid-speech
+                'vad_frame_ms': 30,
+                'vad_hangover_ms': 300,  # Pause length that ends a segment
+                'vad_min_segment_seconds': 0.5,
+                'vad_max_segment_seconds': 10,
+                'adaptive_segments': True,  # Tune segment length from latency, queue depth and pauses
+                'adaptive_min_segment_seconds': 1.5,  # Shortest target the controller picks
+                'adaptive_max_hangover_ms': 1000,  # Longest pause the segmenter may wait for
+                'adaptive_target_utilization': 0.5,  # Share of request capacity the controller aims to use
+                'noise_gate': 'adaptive',  # 'adaptive' noise floor or 'static' audio_threshold
+                'noise_gate_snr_db': 10,  # Frames this far above the floor count as speech
+                'noise_gate_min_speech_ratio': 0.2,  # Share of speech frames a segment needs
+                'trim_silence': True,  # Cut leading/trailing silence before upload
+                'trim_padding_ms': 150,  # Silence kept around the speech
+                'squeeze_pauses': False,  # Also shorten long pauses inside a segment
+                'max_pause_ms': 400,
+                'upload_encoding': 'auto',  # 'auto', 'wav', 'flac', 'opus' or 'mulaw'
+                'translation_workers': 3,  # Segments translated concurrently
+                'pipeline_engine': 'threads',  # 'threads' (worker pool) or 'asyncio'
+                'async_max_concurrency': 16,  # Requests in flight with the asyncio engine
+                'max_queue_size': 8,  # Segments waiting for translation
+                'queue_latency_budget_seconds': 6,  # Older queued segments count as stale
+                'queue_overload_policy': 'drop_oldest',  # 'drop_oldest', 'merge' or 'degrade'
+                'degraded_audio_model': 'whisper-1',  # Cheaper model used by the 'degrade' policy
+                'max_merged_segment_seconds': 20,  # Longest request the 'merge' policy builds
+                'pipeline_two_stage': True,  # Overlap Whisper ASR and text translation across segments
+                'mt_workers': 2,  # Text translation workers for the two-stage paths
+                'stream_partial_results': True,  # Show translations while they are generated
+                'translation_cache_size': 512,  # Transcript translations kept in memory
+                'translation_cache_persist': False,  # Also keep them on disk across restarts
+                'translation_cache_path': 'translation_cache.db',
+                'audio_fingerprint_cache_size': 64,  # Recent segments matched against repeated audio
+                'audio_fingerprint_max_bit_error': 0.33,  # Fingerprint distance still counted as a repeat
+                'mt_batch_size': 8,  # Most transcripts translated in one text request
+                'mt_batch_window_ms': 25,  # How long an MT worker waits for more transcripts to batch
+                'http_pool_size': 10,  # Pooled keep-alive connections shared by the OpenAI clients
+                'http_keepalive_seconds': 120,  # How long an idle connection is kept open
+                'http_timeout_seconds': 30,
+                'http_connect_timeout_seconds': 5,
+                'http2': False,  # Needs the h2 package (pip install httpx[http2])
+                'openai_timeout_seconds': 20,  # Per-request timeouts by provider
+                'gemini_timeout_seconds': 20,
+                'provider_max_retries': 2,  # Retries of timeouts, connection errors, 429 and 5xx
+                'retry_backoff_seconds': 0.5,  # Base of the jittered exponential backoff
+                'retry_backoff_max_seconds': 8,
+                'hedge_model': '',  # Second model raced against slow requests ('' disables hedging)
+                'hedge_percentile': 95,  # Hedge once a request is slower than this percentile
+                'hedge_delay_seconds': 4,  # Hedge delay until enough latencies have been seen
+                'circuit_breaker_failures': 5,  # Consecutive failures that pause a provider
+                'circuit_breaker_reset_seconds': 30,  # Pause before a probe request is let through
+                'router_latency_budget_seconds': 3,  # Auto model: slowest acceptable predicted latency
+                'router_optimize': 'quality',  # 'quality' (router_models order), 'cost' or 'latency'
+                'router_models': ['gpt-4o-audio-preview', 'gemini-1.5-flash', 'whisper-1'],  # Best first
+                # Requests/tokens per minute by provider or model; match your account tier
+                'rate_limits': {name: dict(limits) for name, limits in DEFAULT_RATE_LIMITS.items()},
+                'rate_limit_max_delay_seconds': 2,  # Longer waits send the segment to degraded_audio_model
+                'rate_limit_fair_share': True,  # Split quotas between sessions sharing an API key
+                'rate_limit_registry_path': '',  # Empty: translator_sessions.db in the user data directory
+                'gemini_audio_mode': 'native',  # 'two_stage' transcribes with Whisper, then translates with Gemini
+                'asr_backend': 'openai',  # 'local' transcribes Gemini routes on the local Whisper model too
+                'local_asr_model': 'small',  # faster-whisper model size or path
+                'local_asr_compute_type': 'int8',
+                'local_asr_threads': 0,  # CPU threads (0 = library default)
+                'local_asr_beam_size': 1,
+                'mt_backend': 'cloud',  # 'local' translates transcripts on the local NLLB model
+                'local_mt_model_path': 'nllb-200-distilled-600M-ct2-int8',  # CTranslate2 model directory
+                'local_mt_compute_type': 'int8',
+                'local_mt_threads': 0,  # CPU threads (0 = library default)
+                'local_mt_beam_size': 2,
+                'local_mt_max_batch_size': 16,
+                'realtime_model': 'gpt-4o-realtime-preview',
+                'realtime_transcription_model': 'whisper-1',
+                'realtime_url': 'wss://api.openai.com/v1/realtime',  # ws://localhost:8765 for mock_realtime_server.py
+                'realtime_resume_seconds': 10  # Audio replayed into a new session after a reconnect
             }
             self.save_config()
     
@@ -71,21 +2087,120 @@ class RealtimeVoiceTranslator:
     
     def setup_audio(self):
         """Initialize audio system"""
+        if pyaudio is None:
+            raise RuntimeError("Audio capture needs PyAudio: pip install pyaudio (see the README for Windows)")
         self.audio = pyaudio.PyAudio()
         
+    def setup_encoders(self):
+        """Register upload encoders and the formats each provider accepts"""
+        # Encoder name -> (encode function, file extension, MIME type)
+        self.audio_encoders = {
+            'wav': (self.encode_wav, 'wav', 'audio/wav'),
+            'flac': (self.encode_flac, 'flac', 'audio/flac'),
+            'opus': (self.encode_opus, 'ogg', 'audio/ogg'),
+            'mulaw': (self.encode_mulaw, 'wav', 'audio/wav'),
+        }
+        
+        # Provider -> accepted encoders, most preferred first ('auto' picks the first)
+        self.upload_formats = {
+            'openai_audio': ['wav'],  # input_audio only takes wav/mp3
+            'whisper': ['flac', 'opus', 'mulaw', 'wav'],
+            'gemini': ['flac', 'opus', 'wav'],  # Inline audio; no mu-law
+        }
+    
+    def setup_translation_cache(self):
+        """Create the transcript translation cache"""
+        path = None
+        if self.config.get('translation_cache_persist', False):
+            path = self.config.get('translation_cache_path', 'translation_cache.db')
+        self.translation_cache = TranslationCache(self.config.get('translation_cache_size', 512), path)
+    
+    def setup_http_transport(self):
+        """Create the pooled HTTP clients shared by all OpenAI clients for the app's lifetime
+
+        The async client is only created for the asyncio engine, whose event loop closes it.
+        """
+        pool_size = max(1, int(self.config.get('http_pool_size', 10)))
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                              keepalive_expiry=self.config.get('http_keepalive_seconds', 120))
+        timeout = httpx.Timeout(self.config.get('http_timeout_seconds', 30),
+                                connect=self.config.get('http_connect_timeout_seconds', 5))
+        http2 = self.config.get('http2', False)
+        use_async = self.config.get('pipeline_engine', 'threads') == 'asyncio'
+        self.async_http_client = None
+        try:
+            self.http_client = httpx.Client(limits=limits, timeout=timeout, http2=http2)
+            if use_async:
+                self.async_http_client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+        except ImportError:
+            print("HTTP/2 needs the h2 package: pip install httpx[http2]. Using HTTP/1.1")
+            self.http_client = httpx.Client(limits=limits, timeout=timeout)
+            if use_async:
+                self.async_http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+    
+    def setup_fault_tolerance(self):
+        """Create per-provider circuit breakers, latency tracking and the hedging pool"""
+        failures = self.config.get('circuit_breaker_failures', 5)
+        reset_seconds = self.config.get('circuit_breaker_reset_seconds', 30)
+        self.circuit_breakers = {
+            'openai': CircuitBreaker('OpenAI', failures, reset_seconds),
+            'gemini': CircuitBreaker('Gemini', failures, reset_seconds)
+        }
+        self.model_latencies = collections.defaultdict(LatencyWindow)
+        # Room for a primary and a hedge request per worker, plus stuck requests timing out
+        self.hedge_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=4 * max(1, int(self.config.get('translation_workers', 3))))
+        self.hedges_sent = 0
+        self.hedges_won = 0
+    
+    def setup_rate_limits(self):
+        """Create the per-provider and per-model quota scheduler"""
+        registry = None
+        if self.config.get('rate_limit_fair_share', True):
+            try:
+                registry = SessionRegistry(self.config.get('rate_limit_registry_path') or
+                                           self.user_data_path('translator_sessions.db'))
+            except (sqlite3.Error, OSError) as e:
+                print(f"Fair sharing of rate limits disabled: {e}")
+        self.rate_limiter = RateLimitScheduler(self.config.get('rate_limits', DEFAULT_RATE_LIMITS), registry)
+    
+    def user_data_path(self, filename):
+        """Path of a file in the per-user data directory, shared by sessions started from any folder"""
+        base = (os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_DATA_HOME') or
+                os.path.join(os.path.expanduser('~'), '.local', 'share'))
+        directory = os.path.join(base, 'RealtimeVoiceTranslator')
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+    
     def setup_openai(self):
         """Initialize OpenAI client"""
         api_key = self.config.get('openai_api_key', '')
+        if api_key and api_key == getattr(self, 'openai_api_key_in_use', None):
+            return  # Unchanged; keep the client
+        self.openai_api_key_in_use = api_key
+        self.rate_limiter.set_api_key('openai', api_key)
         if api_key:
-            self.client = OpenAI(api_key=api_key)
+            # Clients share the pooled transport, so a new key keeps warm connections
+            # Retries are done by call_provider, which also feeds the circuit breaker
+            timeout = self.config.get('openai_timeout_seconds', 20)
+            self.client = OpenAI(api_key=api_key, http_client=self.http_client, timeout=timeout, max_retries=0)
+            self.async_client = None
+            if self.async_http_client:
+                self.async_client = AsyncOpenAI(api_key=api_key, http_client=self.async_http_client,
+                                                timeout=timeout, max_retries=0)
         else:
             self.client = None
+            self.async_client = None
     
     def setup_gemini(self):
         """Initialize Gemini client"""
         try:
             import google.generativeai as genai
             api_key = self.config.get('gemini_api_key', '')
+            if api_key and api_key == getattr(self, 'gemini_api_key_in_use', None):
+                return  # Unchanged; keep the client and its open channel
+            self.gemini_api_key_in_use = api_key
+            self.rate_limiter.set_api_key('gemini', api_key)
             if api_key:
                 genai.configure(api_key=api_key)
                 self.gemini_client = genai.GenerativeModel('gemini-1.5-flash')
@@ -145,6 +2260,8 @@ class RealtimeVoiceTranslator:
             'eu': ('🏴󠁥󠁳󠁰󠁶󠁿', 'Basque'),
             'ca': ('🏴󠁥󠁳󠁣󠁴󠁿', 'Catalan'),
             'gl': ('🏴󠁥󠁳󠁧󠁡󠁿', 'Galician'),
+            'ne': ('🇳🇵', 'Nepali'),
+            'mr': ('🇮🇳', 'Marathi'),
         }
         
         # Try to match by language code
@@ -160,32 +2277,51 @@ class RealtimeVoiceTranslator:
         return '🌐', language_code.title()
     
     def detect_language_from_text(self, text):
-        """Detect language from text using OpenAI"""
+        """Detect language from text locally (no network round trip)"""
         try:
-            if not self.client:
-                return 'unknown', 0
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Detect the language of this text and return only the language code (like 'en', 'es', 'th', 'id', etc.) and confidence percentage (0-100). Format: 'language_code,confidence'. Text: '{text}'"
-                    }
-                ]
-            )
-            
-            result = response.choices[0].message.content.strip()
-            if ',' in result:
-                lang_code, confidence = result.split(',')
-                return lang_code.strip(), int(confidence.strip().replace('%', ''))
-            else:
-                return result.strip(), 85  # Default confidence
-                
+            return self.language_detector.detect(text)
         except Exception as e:
             print(f"Language detection error: {e}")
             return 'unknown', 0
     
+    def estimate_language_confidence(self, text, detected_lang, logprob_confidence=None):
+        """Confidence that ``text`` is in ``detected_lang``
+
+        Combines the local detector with Whisper's segment log-probabilities
+        when they are available.
+        """
+        local_lang, local_confidence = self.detect_language_from_text(text)
+        same_language = (self.get_language_flag_and_name(local_lang)[1].lower() ==
+                         self.get_language_flag_and_name(detected_lang)[1].lower())
+        if same_language:
+            return max(local_confidence, logprob_confidence or 0)
+        if logprob_confidence is not None:
+            return logprob_confidence
+        return max(1, 100 - local_confidence)
+    
+    def whisper_logprob_confidence(self, transcription):
+        """Turn verbose_json segment log-probabilities into a 0-100 confidence"""
+        segments = getattr(transcription, 'segments', None) or []
+        logprobs = [getattr(segment, 'avg_logprob', None) for segment in segments]
+        logprobs = [value for value in logprobs if value is not None]
+        if not logprobs:
+            return None
+        no_speech = [getattr(segment, 'no_speech_prob', 0) or 0 for segment in segments]
+        confidence = np.exp(np.mean(logprobs)) * (1 - np.mean(no_speech))
+        return int(round(100 * min(1.0, max(0.0, confidence))))
+    
+    def build_transcript(self, transcription):
+        """Return (text, language, confidence) for a Whisper result, or None if empty"""
+        if not transcription.text.strip():
+            return None
+        
+        # Detect source language
+        original_text = transcription.text.strip()
+        detected_lang = getattr(transcription, 'language', 'unknown')
+        confidence = self.estimate_language_confidence(
+            original_text, detected_lang, self.whisper_logprob_confidence(transcription))
+        return original_text, detected_lang, confidence
+    
     def setup_gui(self):
         """Setup the GUI"""
         self.root = tk.Tk()
@@ -234,6 +2370,12 @@ class RealtimeVoiceTranslator:
                                    fg=self.colors['success'], bg=self.colors['secondary'])
         self.status_label.pack(pady=(0, 15))
         
+        # Router decision (auto model only)
+        self.route_label = tk.Label(header_frame, text="", 
+                                  font=('Arial', 9),
+                                  fg=self.colors['text_secondary'], bg=self.colors['secondary'])
+        self.route_label.pack(pady=(0, 10))
+        
         # Configuration frame
         config_frame = tk.LabelFrame(main_frame, text="Configuration", 
                                    fg=self.colors['text'], bg=self.colors['bg'],
@@ -297,8 +2439,13 @@ class RealtimeVoiceTranslator:
         # Find current model display name
         current_model = self.config.get('selected_audio_model', 'gpt-4o-audio-preview')
         self.audio_models = {
+            'Auto (Latency-aware Router)': 'auto',
             'Whisper-1 (Transcribe + Translate)': 'whisper-1',
+            'Whisper-1 Translate (English, 1 request)': 'whisper-translate',
+            'Local Whisper (Offline ASR) + GPT Translate': 'local-whisper',
+            'Local Whisper + Local Translate (Offline)': 'local-offline',
             'GPT-4o Audio Preview': 'gpt-4o-audio-preview',
+            'OpenAI Realtime (Streaming)': 'realtime',
             'OpenAI GPT-4o-transcribe': 'openai_gpt4o_transcribe',
             'OpenAI GPT-4o-mini-transcribe': 'openai_gpt4o_mini_transcribe',
             'Gemini 1.5 Flash (Audio)': 'gemini-1.5-flash',
@@ -615,14 +2762,25 @@ class RealtimeVoiceTranslator:
         """Start real-time translation"""
         selected_model = self.config.get('selected_audio_model', 'gpt-4o-audio-preview')
         
-        # Check if we have the required API key for the selected model
-        if selected_model.startswith('gemini'):
-            if not self.gemini_client:
-                messagebox.showerror("Error", "Please configure your Gemini API key first!")
+        # Check that we have the API keys for the providers the selected model actually calls
+        if selected_model == 'auto':
+            if not self.routable_models(self.config.get('target_language', 'English')):
+                messagebox.showerror("Error", "Please configure an API key for one of the router models first!")
                 return
         else:
-            if not self.client:
-                messagebox.showerror("Error", "Please configure your OpenAI API key first!")
+            missing = self.missing_api_keys(selected_model)
+            if missing:
+                messagebox.showerror("Error", f"Please configure your {' and '.join(missing)} API key first!")
+                return
+        
+        if selected_model == 'realtime' and not self.start_realtime_session():
+            return
+        if self.config.get('segmentation_mode', 'vad') == 'sliding' and selected_model != 'realtime':
+            caption_model = self.caption_model(selected_model)
+            try:
+                self.check_two_stage_clients(caption_model)
+            except TranslationError as e:
+                messagebox.showerror("Error", f"Live captions with {caption_model}: {e}")
                 return
         
         self.is_recording = True
@@ -634,11 +2792,79 @@ class RealtimeVoiceTranslator:
             bg=self.colors['error'],
             activebackground='#ff8a8a'
         )
-        self.status_label.config(text="● Recording & Translating (5s intervals)", fg=self.colors['success'])
+        if selected_model == 'realtime':
+            status_text = "● Connecting (streaming)..."
+        elif self.config.get('segmentation_mode', 'vad') == 'sliding':
+            status_text = "● Recording & Translating (live captions)"
+            self.start_sliding_windows(selected_model)
+        elif self.config.get('segmentation_mode', 'vad') == 'vad':
+            status_text = "● Recording & Translating (voice activity)"
+        else:
+            interval = 'adaptive' if self.config.get('adaptive_segments', True) else f"{self.record_seconds}s"
+            status_text = f"● Recording & Translating ({interval} intervals)"
+        self.status_label.config(text=status_text, fg=self.colors['success'])
         
         # Start audio recording thread
         self.audio_thread = threading.Thread(target=self.record_audio_continuously, daemon=True)
         self.audio_thread.start()
+        
+        # Open provider connections while the first segment is still being spoken
+        threading.Thread(target=self.warm_up_connections, args=(selected_model,), daemon=True).start()
+    
+    def missing_api_keys(self, model):
+        """Names of the providers a model sends requests to that have no client configured"""
+        if model == 'realtime':
+            url = self.config.get('realtime_url', 'wss://api.openai.com/v1/realtime')
+            if urllib.parse.urlparse(url).hostname in ('localhost', '127.0.0.1', '::1'):
+                return []  # mock_realtime_server.py takes no key
+        providers = {provider for provider, _, _ in self.segment_requests(model, 0)}
+        missing = []
+        if 'openai' in providers and not self.client:
+            missing.append("OpenAI")
+        if 'gemini' in providers and not self.gemini_client:
+            missing.append("Gemini")
+        return missing
+    
+    def caption_model(self, selected_model):
+        """Model for live captions, which need a transcript per window
+
+        Gemini models run as transcription plus Gemini translation whatever
+        gemini_audio_mode says; models without a transcribe-then-translate
+        route fall back to Whisper-1.
+        """
+        if self.is_two_stage_model(selected_model) or selected_model.startswith('gemini'):
+            return selected_model
+        return 'whisper-1'
+    
+    def start_sliding_windows(self, selected_model):
+        """Start the worker that turns overlapping windows into live captions"""
+        model = self.caption_model(selected_model)
+        if model != selected_model:
+            print(f"Live captions transcribe with Whisper-1 instead of {selected_model}")
+        self.sliding_windows = queue.Queue()
+        threading.Thread(target=self.process_sliding_windows, args=(model,), daemon=True).start()
+    
+    def warm_up_connections(self, selected_model):
+        """Open pooled connections (DNS, TCP and TLS) and load local models before the first request"""
+        try:
+            if self.client:
+                # Any response will do; the connection stays in the keep-alive pool
+                self.http_client.head(str(self.client.base_url))
+                if self.async_engine:
+                    asyncio.run_coroutine_threadsafe(
+                        self.async_http_client.head(str(self.async_client.base_url)),
+                        self.async_engine.loop
+                    ).result()
+            if self.gemini_client and selected_model.startswith('gemini'):
+                import google.generativeai as genai
+                genai.get_model(self.gemini_client.model_name)
+            if self.uses_local_asr(selected_model):
+                # Not a connection, but the same idea: load the model before the first segment
+                self.local_asr.preload()
+            if self.uses_local_mt(selected_model):
+                self.local_translator.preload()
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
     
     def stop_translation(self):
         """Stop real-time translation"""
@@ -653,125 +2879,1044 @@ class RealtimeVoiceTranslator:
         )
         self.status_label.config(text="● Stopped", fg=self.colors['error'])
         self.audio_level_var.set(0)
+        
+        if self.config.get('segmentation_mode', 'vad') == 'sliding':
+            self.sliding_windows.put(None)
+        if self.realtime_session:
+            self.realtime_session.stop()
+            self.abandon_realtime_turns()
+            print(f"Realtime session: {self.realtime_session.reconnects} reconnects")
+            self.realtime_session = None
+        
+        metrics = self.audio_queue.metrics
+        print(f"Audio queue: max depth {metrics['max_depth']}, max wait {metrics['max_wait']:.1f}s, "
+              f"dropped {metrics['dropped']}, merged {metrics['merged']}, degraded {metrics['degraded']}")
+        print(f"Translation cache: {self.translation_cache.hits} hits, {self.translation_cache.misses} misses "
+              f"({self.translation_cache.hit_rate():.0%} hit rate)")
+        print(f"Repeated audio skipped: {self.audio_fingerprints.hits} of "
+              f"{self.audio_fingerprints.hits + self.audio_fingerprints.misses} fingerprinted segments")
+        if self.config.get('hedge_model', ''):
+            print(f"Hedged requests: {self.hedges_sent} sent, {self.hedges_won} answered first")
+        if self.config.get('selected_audio_model') == 'auto':
+            for line in self.model_router.summary():
+                print(f"Router: {line}")
+    
+    def audio_callback(self, in_data, frame_count, time_info, status):
+        """PyAudio callback: copy captured samples into the ring buffer"""
+        if status & pyaudio.paInputOverflow:
+            self.ring_buffer.input_overflows += 1
+        self.ring_buffer.write(in_data)
+        return (None, pyaudio.paContinue)
     
     def record_audio_continuously(self):
         """Continuously record and process audio"""
         try:
+            window = int(self.sample_rate * self.record_seconds)
+            use_vad = self.config.get('segmentation_mode', 'vad') == 'vad'
+            use_sliding = self.config.get('segmentation_mode', 'vad') == 'sliding'
+            max_segment = self.config.get('vad_max_segment_seconds', 10)
+            ring_seconds = self.config.get('ring_buffer_seconds', 30)
+            sliding_window = int(self.sample_rate * self.config.get('sliding_window_seconds', 6))
+            hop = max(self.chunk_size, int(self.sample_rate * self.config.get('sliding_hop_seconds', 1.5)))
+            capacity = max(int(self.sample_rate * ring_seconds), window * 2,
+                           int(self.sample_rate * max_segment) * 2, sliding_window * 2)
+            self.ring_buffer = AudioRingBuffer(capacity)
+            
+            if self.config.get('noise_gate', 'adaptive') == 'adaptive':
+                self.noise_floor = NoiseFloorEstimator(
+                    max(1, int(self.sample_rate * self.config.get('vad_frame_ms', 30) / 1000)),
+                    speech_snr_db=self.config.get('noise_gate_snr_db', 10),
+                    min_speech_ratio=self.config.get('noise_gate_min_speech_ratio', 0.2)
+                )
+            else:
+                self.noise_floor = None
+            
+            self.segment_controller = None
+            if self.config.get('adaptive_segments', True) and not (use_sliding or self.realtime_session):
+                self.segment_controller = self.create_segment_controller()
+            
+            if use_vad:
+                self.segmenter = VoiceActivitySegmenter(
+                    self.sample_rate,
+                    self.config.get('audio_threshold', 500),
+                    frame_ms=self.config.get('vad_frame_ms', 30),
+                    hangover_ms=self.config.get('vad_hangover_ms', 300),
+                    min_segment_seconds=self.config.get('vad_min_segment_seconds', 0.5),
+                    max_segment_seconds=max_segment,
+                    noise_floor=self.noise_floor,
+                    on_pause=self.segment_controller.observe_pause if self.segment_controller else None
+                )
+            
             stream = self.audio.open(
                 format=self.audio_format,
                 channels=self.channels,
                 rate=self.sample_rate,
                 input=True,
-                frames_per_buffer=self.chunk_size
+                frames_per_buffer=self.chunk_size,
+                stream_callback=self.audio_callback
             )
+            stream.start_stream()
             
+            segment_start = 0
+            streamed = 0
+            utterance_start = None
+            next_hop = hop
+            segment_limits = None
+            next_level = self.chunk_size
             while self.is_recording:
-                # Record for specified duration
-                frames = []
-                for _ in range(0, int(self.sample_rate / self.chunk_size * self.record_seconds)):
-                    if not self.is_recording:
-                        break
-                    
-                    data = stream.read(self.chunk_size, exception_on_overflow=False)
-                    frames.append(data)
-                    
-                    # Update audio level indicator
-                    audio_data = np.frombuffer(data, dtype=np.int16)
-                    audio_level = np.abs(audio_data).mean()
+                if not self.ring_buffer.wait_for(next_level, timeout=0.5):
+                    continue
+                written = self.ring_buffer.write_pos
+                next_level = written + self.chunk_size
+                
+                # Update audio level indicator from the newest chunk
+                latest = self.ring_buffer.read(written - self.chunk_size, self.chunk_size)
+                if latest is not None:
+                    audio_level = np.abs(latest).mean()
                     level_percent = min(100, (audio_level / 1000) * 100)
-                    self.root.after(0, lambda: self.audio_level_var.set(level_percent))
+                    self.root.after(0, lambda p=level_percent: self.audio_level_var.set(p))
                 
-                if frames and self.is_recording:
-                    # Convert to audio data
-                    audio_data = b''.join(frames)
-                    
-                    # Check if audio level is above threshold
-                    audio_array = np.frombuffer(audio_data, dtype=np.int16)
-                    if np.abs(audio_array).mean() > self.config.get('audio_threshold', 500):
-                        # Add to processing queue
-                        self.audio_queue.put(audio_data)
+                if self.realtime_session:
+                    # Stream every sample as it arrives; the server finds the turns
+                    audio_array = self.ring_buffer.read(streamed, written - streamed)
+                    if audio_array is not None:
+                        self.realtime_session.send_audio(audio_array)
+                    streamed = written
+                    continue
+                
+                if use_sliding:
+                    if written >= next_hop:
+                        next_hop = written + hop
+                        utterance_start = self.queue_sliding_window(utterance_start, written, hop, sliding_window)
+                    continue
+                
+                if use_vad:
+                    if self.segment_controller:
+                        limits = self.segment_controller.limits()
+                        if limits != segment_limits:
+                            self.segmenter.set_limits(*limits)
+                            segment_limits = limits
+                    # Endpoint on pauses instead of fixed windows
+                    for start, end in self.segmenter.feed(self.ring_buffer):
+                        self.enqueue_segment(start, end)
+                    continue
+                
+                if written - segment_start < window:
+                    continue
+                
+                audio_array = self.ring_buffer.read(segment_start, window)
+                if audio_array is None:
+                    # Reader was lapped; resynchronise with the writer
+                    segment_start = written
+                    continue
+                position = segment_start
+                segment_start += window
+                if self.segment_controller:
+                    window = int(self.sample_rate * self.segment_controller.segment_seconds)
+                
+                # Check if the window holds speech
+                if self.noise_floor is not None:
+                    has_speech = self.noise_floor.holds_speech(audio_array, adapt=True)
+                else:
+                    has_speech = np.abs(audio_array).mean() > self.config.get('audio_threshold', 500)
+                if has_speech:
+                    # Add to processing queue (zero-copy view into the ring)
+                    self.queue_audio_segment(audio_array, position)
             
             stream.stop_stream()
             stream.close()
             
+            if self.ring_buffer.overruns or self.ring_buffer.input_overflows:
+                print(f"Audio capture: {self.ring_buffer.overruns} overruns, "
+                      f"{self.ring_buffer.input_overflows} input overflows")
+            if self.noise_floor is not None:
+                print(f"Noise gate: suppressed {self.noise_floor.suppressed} of "
+                      f"{self.noise_floor.suppressed + self.noise_floor.accepted} segments "
+                      f"(noise floor {self.noise_floor.floor:.0f})")
+            
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Audio Error", f"Error recording audio: {str(e)}"))
+            self.root.after(0, lambda message=str(e): messagebox.showerror("Audio Error",
+                                                                           f"Error recording audio: {message}"))
+    
+    def create_segment_controller(self):
+        """Segment length controller sized for the engine's concurrency and the rate limits"""
+        if self.config.get('pipeline_engine', 'threads') == 'asyncio':
+            workers = self.config.get('async_max_concurrency', 16)
+        else:
+            workers = self.config.get('translation_workers', 3)
+        return SegmentLengthController(
+            self.record_seconds,
+            self.config.get('adaptive_min_segment_seconds', 1.5),
+            self.config.get('vad_max_segment_seconds', 10),
+            int(workers),
+            self.config.get('adaptive_target_utilization', 0.5),
+            self.config.get('vad_hangover_ms', 300),
+            self.config.get('adaptive_max_hangover_ms', 1000),
+            quota_rate=self.segment_quota_rate
+        )
+    
+    def segment_quota_rate(self, seconds):
+        """Segments of this length per second that the rate limits allow for the selected model"""
+        selected_model = self.config.get('selected_audio_model', 'gpt-4o-audio-preview')
+        models = [selected_model]
+        if selected_model == 'auto':
+            models = self.routable_models(self.config.get('target_language', 'English'))
+        return max((self.rate_limiter.sustainable_rate(self.segment_requests(model, seconds)) for model in models),
+                   default=float('inf'))
+    
+    def enqueue_segment(self, start, end):
+        """Queue the ring-buffer samples between two positions for translation"""
+        audio_array = self.ring_buffer.read(start, end - start)
+        if audio_array is None:
+            return
+        if self.noise_floor is not None and not self.noise_floor.holds_speech(audio_array):
+            return
+        self.queue_audio_segment(audio_array, start)
+    
+    def queue_sliding_window(self, utterance_start, written, hop, window):
+        """Queue the latest overlapping window while speech goes on, and a closing one when it pauses
+
+        Returns the ring position where the current utterance started, or None between utterances.
+        """
+        recent = self.ring_buffer.read(written - hop, hop)
+        if recent is None:
+            return utterance_start
+        if self.noise_floor is not None:
+            speech = self.noise_floor.holds_speech(recent, adapt=True)
+        else:
+            speech = np.abs(recent).mean() > self.config.get('audio_threshold', 500)
+        
+        if speech:
+            if utterance_start is None:
+                # Start a hop early so the first word isn't cut
+                utterance_start = max(0, written - 2 * hop)
+            self.sliding_windows.put((max(utterance_start, written - window), written, True))
+            return utterance_start
+        if utterance_start is not None:
+            self.sliding_windows.put((max(utterance_start, written - window), written, False))
+        return None
+    
+    def next_sliding_window(self, max_samples):
+        """Next window to transcribe
+
+        If transcription has fallen behind, queued windows are merged into one
+        that spans them (up to a closing window), so no audio is skipped unless
+        the span would exceed ``max_samples``; then only its newest part is kept.
+        """
+        window = self.sliding_windows.get()
+        while window is not None and window[2]:
+            with self.sliding_windows.mutex:
+                newer = self.sliding_windows.queue[0] if self.sliding_windows.queue else None
+            if not newer:
+                break
+            newer = self.sliding_windows.get()
+            window = (max(window[0], newer[1] - max_samples), newer[1], newer[2])
+        return window
+    
+    def process_sliding_windows(self, model):
+        """Transcribe overlapping windows and keep a live caption of the current utterance
+
+        Each window's transcript is split by a PrefixStabilizer: committed words
+        are translated once and stay fixed on screen, while only the tentative
+        tail is re-translated and redrawn as later windows revise it. A hop
+        that finds no rate-limit quota is skipped and its audio merged into the
+        next window (up to sliding_max_caption_seconds); the window that ends
+        an utterance waits for quota instead.
+        """
+        target_lang = self.config.get('target_language', 'English')
+        max_caption = int(self.sample_rate * self.config.get('sliding_max_caption_seconds', 20))
+        max_window = int(self.sample_rate * self.config.get('sliding_window_seconds', 6))
+        stabilizer = PrefixStabilizer()
+        caption = None
+        previous = None  # (start, end) of the previous window in this utterance
+        skipped_start = None  # Start of the earliest hop skipped for lack of quota since the last one sent
+        while True:
+            window = self.next_sliding_window(max_window)
+            if window is None:
+                break
+            start, end, speech_continues = window
+            if skipped_start is not None:
+                start = max(min(start, skipped_start), end - max_caption)
+            requests = self.caption_requests(model, (end - start) / self.sample_rate)
+            if speech_continues:
+                if self.rate_limiter.reserve(requests, 0) is None:
+                    skipped_start = start
+                    continue
+            else:
+                time.sleep(self.rate_limiter.reserve(requests))
+            skipped_start = None
+            try:
+                audio_data = self.ring_buffer.read(start, end - start)
+                try:
+                    transcript = self.transcribe_segment(audio_data, model) if audio_data is not None else None
+                except Exception as e:
+                    print(f"Transcription error: {e}")  # The next window tries again
+                    transcript = None
+                if transcript:
+                    hop_fraction = 0 if previous is None else (start - previous[0]) / (previous[1] - previous[0])
+                    previous = (start, end)
+                    committed, tentative = stabilizer.update(transcript[0], hop_fraction)
+                    if caption is None:
+                        caption = self.new_caption(start)
+                    caption['joiner'] = stabilizer.joiner
+                    caption['language'], caption['confidence'] = transcript[1], transcript[2]
+                    self.advance_caption(caption, committed, tentative, target_lang, model)
+                
+                if caption and not speech_continues:
+                    self.advance_caption(caption, stabilizer.flush(), '', target_lang, model)
+                    self.finish_caption(caption, target_lang)
+                    caption = None
+                elif caption and end - caption['start'] > max_caption:
+                    # Close the caption at its committed text; the tentative tail opens the next one
+                    caption['tail_source'] = caption['tail_translation'] = ''
+                    self.finish_caption(caption, target_lang)
+                    caption = None
+                if not speech_continues:
+                    previous = None
+            except Exception as e:
+                print(f"Sliding window error: {e}")
+        
+        if caption:
+            self.advance_caption(caption, stabilizer.flush(), '', target_lang, model)
+            self.finish_caption(caption, target_lang)
+    
+    def caption_requests(self, model, duration):
+        """The provider requests one caption window may make: [(provider, model, estimated tokens)]"""
+        requests = [] if self.uses_local_asr(model) else [('openai', 'whisper-1', 0)]
+        if not self.uses_local_mt(model):
+            mt_tokens = 100 + int(10 * duration)
+            mt_request = (('gemini', model, mt_tokens) if model.startswith('gemini')
+                          else ('openai', 'gpt-4o-mini', mt_tokens))
+            # Newly committed words and the re-translated tentative tail
+            requests += [mt_request, mt_request]
+        return requests
+    
+    def new_caption(self, start):
+        """State of a live caption, shown under the next sequence number"""
+        return {'sequence': next(self.segment_counter), 'start': start, 'joiner': ' ',
+                'language': 'unknown', 'confidence': 0, 'source': [], 'translation': [],
+                'tail_source': '', 'tail_translation': ''}
+    
+    def advance_caption(self, caption, committed, tentative, target_lang, model):
+        """Translate newly committed text once, re-translate the tentative tail, and redraw"""
+        if committed:
+            if committed == caption['tail_source']:
+                # Already translated as the tail, with the same context
+                translated_text = caption['tail_translation']
+            else:
+                translated_text = self.translate_text(committed, caption['language'], target_lang, model,
+                                                      context=caption['joiner'].join(caption['source']))
+            caption['source'].append(committed)
+            caption['translation'].append(translated_text.strip())
+        if tentative != caption['tail_source']:
+            caption['tail_source'] = tentative
+            caption['tail_translation'] = self.translate_text(
+                tentative, caption['language'], target_lang, model,
+                context=caption['joiner'].join(caption['source'])).strip() if tentative else ''
+        
+        spans = self.caption_spans(caption, target_lang)
+        sequence = caption['sequence']
+        self.root.after(0, lambda: self.show_caption(sequence, spans))
+    
+    def caption_text(self, caption, target_lang):
+        """Committed (source, translation) text of a caption"""
+        joiner = '' if target_lang in ('Chinese', 'Japanese') else ' '
+        return caption['joiner'].join(caption['source']), joiner.join(caption['translation'])
+    
+    def caption_spans(self, caption, target_lang):
+        """A live caption as (text, tentative) display spans"""
+        source, translation = self.caption_text(caption, target_lang)
+        target_flag, target_name = self.get_language_flag_and_name(target_lang)
+        return [(f"⏳ {source} ".replace('  ', ' '), False), (caption['tail_source'], True),
+                (f"\n{target_flag} ({target_name}): {translation} ".replace('  ', ' '), False),
+                (caption['tail_translation'], True)]
+    
+    def finish_caption(self, caption, target_lang):
+        """Report a caption's committed text as its final translation"""
+        source, translation = self.caption_text(caption, target_lang)
+        if not translation.strip():
+            self.report_translation(caption['sequence'], None)
+            return
+        self.report_translation(caption['sequence'], self.format_translation_with_detection(
+            source, translation, caption['language'], target_lang, caption['confidence']))
+    
+    def queue_audio_segment(self, audio_array, position=None):
+        """Tag a segment with its spoken-order sequence number and queue it
+
+        With a ring ``position`` the audio is a ring view, checked and copied when it is dequeued.
+        """
+        source = (self.ring_buffer, position) if position is not None else None
+        self.audio_queue.put(next(self.segment_counter), audio_array, source)
+    
+    def start_realtime_session(self):
+        """Open the Realtime WebSocket session that the capture loop streams into; False if it can't run"""
+        if importlib.util.find_spec('websockets') is None:
+            messagebox.showerror("Error", "OpenAI Realtime needs the websockets package:\n"
+                                          "pip install -r requirements-realtime.txt")
+            return False
+        
+        target_lang = self.config.get('target_language', 'English')
+        session_config = {
+            'modalities': ['text'],
+            'instructions': (f"You are an interpreter. Translate everything the user says into {target_lang}. "
+                             f"Reply with only the translation. If it is already in {target_lang}, repeat it."),
+            'input_audio_format': 'pcm16',
+            'input_audio_transcription': {'model': self.config.get('realtime_transcription_model', 'whisper-1')},
+            # A new turn must not cut off the translation of the previous one
+            'turn_detection': {'type': 'server_vad', 'interrupt_response': False,
+                               'silence_duration_ms': self.config.get('vad_hangover_ms', 300)}
+        }
+        url = (f"{self.config.get('realtime_url', 'wss://api.openai.com/v1/realtime')}"
+               f"?model={self.config.get('realtime_model', 'gpt-4o-realtime-preview')}")
+        headers = {'Authorization': f"Bearer {self.config.get('openai_api_key', '')}", 'OpenAI-Beta': 'realtime=v1'}
+        
+        self.realtime_turns = {}  # item_id -> turn state, from speech start until translated
+        self.realtime_responses = {}  # response_id -> item_id
+        self.realtime_committed = collections.deque()  # Committed item_ids waiting for their response
+        self.realtime_session = RealtimeSession(url, headers, session_config, self.handle_realtime_event,
+                                                self.realtime_disconnected, self.sample_rate,
+                                                self.config.get('realtime_resume_seconds', 10), self.retry_delay)
+        self.realtime_session.start()
+        return True
+    
+    def realtime_turn(self, item_id):
+        """The state of a Realtime turn, created (with the next sequence number) on first sight"""
+        if item_id not in self.realtime_turns:
+            sequence = next(self.segment_counter)
+            self.realtime_turns[item_id] = {
+                'sequence': sequence, 'items': [item_id], 'transcript': '', 'translation': '',
+                'transcribed': False, 'answered': False, 'on_partial': self.make_partial_callback(sequence)
+            }
+        return self.realtime_turns[item_id]
+    
+    def handle_realtime_event(self, event):
+        """Turn Realtime server events into partial and final translations (session thread)"""
+        kind = event.get('type', '')
+        if kind in ('session.created', 'session.updated'):
+            self.root.after(0, lambda: self.status_label.config(text="● Recording & Translating (streaming)",
+                                                                fg=self.colors['success']))
+            return
+        if kind == 'error':
+            print(f"Realtime API error: {event.get('error', {}).get('message')}")
+            return
+        
+        if kind == 'input_audio_buffer.speech_started':
+            item_id = event['item_id']
+            self.realtime_turn(item_id)
+        elif kind == 'input_audio_buffer.committed':
+            item_id = event['item_id']
+            self.realtime_turn(item_id)
+            self.realtime_committed.append(item_id)
+        elif kind == 'response.created':
+            # Server VAD answers committed turns one response each, in order
+            if not self.realtime_committed:
+                return
+            item_id = self.realtime_committed.popleft()
+            self.realtime_responses[event['response']['id']] = item_id
+        elif kind.startswith('conversation.item.input_audio_transcription.'):
+            item_id = event.get('item_id')
+            if item_id not in self.realtime_turns:
+                return
+            turn = self.realtime_turns[item_id]
+            if kind.endswith('.delta'):
+                turn['transcript'] += event.get('delta', '')
+            elif kind.endswith('.completed'):
+                turn['transcript'] = event.get('transcript', turn['transcript'])
+                turn['transcribed'] = True
+            elif kind.endswith('.failed'):
+                print(f"Realtime transcription failed: {event.get('error', {}).get('message')}")
+                turn['transcribed'] = True
+        elif kind in ('response.text.delta', 'response.output_text.delta', 'response.done'):
+            response_id = event['response']['id'] if kind == 'response.done' else event.get('response_id')
+            item_id = self.realtime_responses.get(response_id)
+            if item_id not in self.realtime_turns:
+                return
+            turn = self.realtime_turns[item_id]
+            if kind == 'response.done':
+                del self.realtime_responses[response_id]
+                turn['items'] += [item['id'] for item in event['response'].get('output', []) if 'id' in item]
+                turn['answered'] = True
+            else:
+                turn['translation'] += event.get('delta', '')
+        else:
+            return
+        self.update_realtime_turn(item_id)
+    
+    def update_realtime_turn(self, item_id):
+        """Show a turn's progress, or report it once it is transcribed and translated"""
+        turn = self.realtime_turns[item_id]
+        target_lang = self.config.get('target_language', 'English')
+        if not (turn['transcribed'] and turn['answered']):
+            if turn['on_partial'] and (turn['transcript'] or turn['translation']):
+                turn['on_partial'](self.format_partial_translation(turn['transcript'], turn['translation'], target_lang))
+            return
+        
+        del self.realtime_turns[item_id]
+        self.realtime_session.finish_turn(item_id)
+        # Finished turns are not needed as context; keep the server conversation small
+        for item in turn['items']:
+            self.realtime_session.send_event({'type': 'conversation.item.delete', 'item_id': item})
+        
+        original_text = turn['transcript'].strip()
+        translated_text = turn['translation'].strip()
+        if not translated_text:
+            translation = None
+        elif not original_text:
+            target_flag, target_name = self.get_language_flag_and_name(target_lang)
+            translation = f"🌐 (Auto-detected) → {target_flag} ({target_name}): {translated_text}\n-------------------------"
+        else:
+            detected_lang, confidence = self.detect_language_from_text(original_text)
+            translation = self.format_translation_with_detection(original_text, translated_text, detected_lang,
+                                                                 target_lang, confidence)
+        self.report_translation(turn['sequence'], translation)
+    
+    def realtime_disconnected(self):
+        """Drop unfinished turns when the connection is lost; their audio is replayed after reconnecting"""
+        self.abandon_realtime_turns()
+        if self.is_translating:
+            self.root.after(0, lambda: self.status_label.config(text="● Reconnecting...", fg=self.colors['accent']))
+    
+    def abandon_realtime_turns(self):
+        """Release the sequence numbers of unfinished Realtime turns so later ones are not held back"""
+        for turn in self.realtime_turns.values():
+            self.report_translation(turn['sequence'], None)
+        self.realtime_turns.clear()
+        self.realtime_responses.clear()
+        self.realtime_committed.clear()
+    
+    def report_translation(self, sequence, translation):
+        """Pass a finished (or dropped) segment on to in-order display"""
+        if self.async_engine:
+            self.async_engine.deliver(sequence, translation)
+        else:
+            self.translation_queue.put((sequence, translation))
+    
+    def start_background_threads(self):
+        """Start background processing threads"""
+        if self.config.get('pipeline_engine', 'threads') == 'asyncio':
+            # Single event loop thread handles translation and display dispatch
+            self.async_engine = AsyncPipelineEngine(self, self.config.get('async_max_concurrency', 16),
+                                                    self.config.get('mt_workers', 2))
+            self.async_engine.start()
+            return
+        
+        # Translation worker pool (also the ASR stage of the pipelined paths)
+        self.processing_threads = []
+        for _ in range(max(1, int(self.config.get('translation_workers', 3)))):
+            worker = threading.Thread(target=self.process_audio_queue, daemon=True)
+            worker.start()
+            self.processing_threads.append(worker)
+        
+        # Text translation workers for the pipelined Whisper/Gemini paths
+        for _ in range(max(1, int(self.config.get('mt_workers', 2)))):
+            worker = threading.Thread(target=self.process_transcript_queue, daemon=True)
+            worker.start()
+            self.processing_threads.append(worker)
+        
+        # Translation display thread
+        self.display_thread = threading.Thread(target=self.update_translation_display, daemon=True)
+        self.display_thread.start()
+    
+    def process_audio_queue(self):
+        """Translation worker: translate segments from the audio queue as they arrive"""
+        while True:
+            segment = self.audio_queue.get()
+            translation = None
+            handed_off = False
+            try:
+                if self.is_translating:
+                    target_lang = self.config.get('target_language', 'English')
+                    selected_model = self.select_segment_model(segment, target_lang)
+                    
+                    # Repeated audio (looping announcements) reuses the earlier result
+                    fingerprint = self.audio_fingerprints.fingerprint(segment.audio)
+                    translation = self.audio_fingerprints.get(fingerprint, selected_model, target_lang)
+                    if translation is None:
+                        selected_model, wait = self.schedule_segment(selected_model, segment.audio)
+                        time.sleep(wait)
+                        started = time.monotonic()  # Service time only: quota waits are not the backend's latency
+                        self.update_processing_status(1)
+                        try:
+                            if self.config.get('pipeline_two_stage', True) and self.is_two_stage_model(selected_model):
+                                # Only transcribe here; MT workers translate while we take the next segment
+                                with self.processing_lock:
+                                    self.asr_in_flight += 1
+                                try:
+                                    transcript = self.transcribe_segment(segment.audio, selected_model)
+                                finally:
+                                    with self.processing_lock:
+                                        self.asr_in_flight -= 1
+                                if transcript:
+                                    self.transcript_queue.put((segment.sequence, transcript, target_lang, selected_model,
+                                                               fingerprint, (segment.audio, time.monotonic() - started)))
+                                    handed_off = True
+                                else:
+                                    self.record_route(selected_model, segment.audio, time.monotonic() - started, True)
+                            else:
+                                translation = self.translate_audio(segment.audio, selected_model,
+                                                                   self.make_partial_callback(segment.sequence))
+                                self.remember_segment(fingerprint, selected_model, target_lang, translation)
+                                self.record_route(selected_model, segment.audio, time.monotonic() - started, True)
+                        except Exception:
+                            self.record_route(selected_model, segment.audio, time.monotonic() - started, False)
+                            raise
+                        finally:
+                            self.update_processing_status(-1)
+                    
+                    translation = self.timestamp_translation(translation)
+                
+            except Exception as e:
+                print(f"Error processing audio: {e}")
+                translation = self.timestamp_translation(self.error_message(e))
+            finally:
+                # Always report back so the display never waits on a missing sequence
+                if not handed_off:
+                    self.report_translation(segment.sequence, translation)
+    
+    def process_transcript_queue(self):
+        """MT worker: translate transcripts produced by the ASR stage"""
+        held = None
+        while True:
+            batch, held = self.next_transcript_batch(held)
+            started = time.monotonic()  # Time spent queued or in the batch window is not service time
+            _, _, target_lang, model, _, _ = batch[0]
+            translations = [None] * len(batch)
+            failed = False
+            try:
+                self.update_processing_status(1)
+                try:
+                    if len(batch) == 1:
+                        # A lone transcript is translated on its own so it can stream
+                        sequence, transcript = batch[0][:2]
+                        translations = [self.translate_transcript(transcript, target_lang, model,
+                                                                  self.make_partial_callback(sequence))]
+                    else:
+                        translations = self.translate_transcript_batch([item[1] for item in batch],
+                                                                       target_lang, model)
+                finally:
+                    self.update_processing_status(-1)
+                
+            except Exception as e:
+                print(f"Translation error: {e}")
+                translations = [self.error_message(e)] * len(batch)
+                failed = True
+            finally:
+                mt_seconds = time.monotonic() - started
+                for (sequence, _, _, _, fingerprint, (audio, asr_seconds)), translation in zip(batch, translations):
+                    if not failed:
+                        self.remember_segment(fingerprint, model, target_lang, translation)
+                    self.record_route(model, audio, asr_seconds + mt_seconds, not failed)
+                    self.report_translation(sequence, self.timestamp_translation(translation))
+    
+    def next_transcript_batch(self, held=None):
+        """Take the next transcript plus others for the same target and model that are queued or arrive shortly after
+
+        ``held`` is a transcript this worker took for its previous batch that did
+        not fit; it starts this one. Returns (batch, transcript to hold for the next).
+        """
+        batch = [held if held is not None else self.transcript_queue.get()]
+        max_batch = max(1, int(self.config.get('mt_batch_size', 8)))
+        deadline = time.monotonic() + self.config.get('mt_batch_window_ms', 25) / 1000
+        while len(batch) < max_batch:
+            if self.transcript_queue.empty() and not self.asr_in_flight:
+                break  # Nothing queued or being transcribed could join; don't wait out the window
+            try:
+                item = self.transcript_queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item[2:4] != batch[0][2:4]:
+                # Different target language or model: it starts this worker's next batch, keeping its place
+                return batch, item
+            batch.append(item)
+        return batch, None
+    
+    def select_segment_model(self, segment, target_lang):
+        """Model for a segment: the overload policy's, the router's (in auto mode) or the selected one"""
+        if segment.model:
+            return segment.model
+        selected_model = self.config.get('selected_audio_model', 'gpt-4o-audio-preview')
+        if selected_model != 'auto':
+            return selected_model
+        
+        duration = len(segment.audio) / self.sample_rate
+        model, estimate, reason = self.model_router.choose(duration, self.routable_models(target_lang))
+        estimate_text = f"~{estimate:.1f}s" if estimate is not None else "no estimate"
+        if model != self.model_router.last_route:
+            print(f"Router: {duration:.1f}s segment -> {model} ({estimate_text}, {reason})")
+            self.model_router.last_route = model
+        route_text = f"Route: {model} ({estimate_text}, {reason})"
+        self.root.after(0, lambda: self.route_label.config(text=route_text))
+        return model
+    
+    def routable_models(self, target_lang):
+        """Router candidates, best first, that have the clients and target language they need"""
+        candidates = []
+        for model in self.config.get('router_models', ['gpt-4o-audio-preview', 'gemini-1.5-flash', 'whisper-1']):
+            providers = {provider for provider, _, _ in self.segment_requests(model, 0)}
+            if ('openai' in providers and not self.client) or ('gemini' in providers and not self.gemini_client):
+                continue
+            if model == 'whisper-translate' and target_lang != 'English':
+                continue
+            candidates.append(model)
+        
+        # For English, one Whisper translation request beats any transcribe-then-translate route
+        if target_lang == 'English' and self.client and 'whisper-translate' not in candidates:
+            two_stage = [index for index, model in enumerate(candidates) if self.is_two_stage_model(model)]
+            candidates.insert(two_stage[0] if two_stage else len(candidates), 'whisper-translate')
+        return candidates
+    
+    def segment_requests(self, model, duration):
+        """The provider requests a segment will make: [(provider, model, estimated tokens)]"""
+        # Text translation: prompt plus a transcript of a few words per second, in and out
+        mt_tokens = 100 + int(10 * duration)
+        if model == 'whisper-translate':
+            return [('openai', 'whisper-1', 0)]
+        if self.uses_native_gemini_audio(model):
+            # Gemini counts 32 tokens per second of audio
+            return [('gemini', model, 32 * int(duration) + 300)]
+        if self.is_two_stage_model(model):
+            requests = [] if self.uses_local_asr(model) else [('openai', 'whisper-1', 0)]
+            if not self.uses_local_mt(model):
+                requests.append(('gemini', model, mt_tokens) if model.startswith('gemini')
+                                else ('openai', 'gpt-4o-mini', mt_tokens))
+            return requests
+        # Audio chat models count about 10 tokens per second of audio
+        return [('openai', model, 10 * int(duration) + 400)]
+    
+    def schedule_segment(self, model, audio_data):
+        """Reserve rate-limit quota for a segment; returns (model, seconds to wait first)
+
+        A segment that would wait longer than rate_limit_max_delay_seconds is
+        downgraded to degraded_audio_model if that fits and its provider is
+        configured, else it waits its turn.
+        """
+        duration = len(audio_data) / self.sample_rate
+        max_delay = self.config.get('rate_limit_max_delay_seconds', 2)
+        wait = self.rate_limiter.reserve(self.segment_requests(model, duration), max_delay)
+        if wait is None:
+            fallback = self.config.get('degraded_audio_model', 'whisper-1')
+            if fallback != model and not self.missing_api_keys(fallback):
+                wait = self.rate_limiter.reserve(self.segment_requests(fallback, duration), max_delay)
+                if wait is not None:
+                    print(f"Rate limit: {model} quota exhausted; sending segment to {fallback}")
+                    model = fallback
+            if wait is None:
+                wait = self.rate_limiter.reserve(self.segment_requests(model, duration))
+                print(f"Rate limit: waiting {wait:.1f}s for {model} quota")
+        return model, wait
+    
+    def record_route(self, model, audio_data, latency, success):
+        """Feed a finished segment's service time and outcome back to the router and segment length controller"""
+        duration = len(audio_data) / self.sample_rate
+        self.model_router.record(model, duration, latency, success)
+        controller = self.segment_controller
+        if controller and success:
+            backlog = self.audio_queue.qsize() + self.transcript_queue.qsize()
+            if controller.observe_segment(duration, latency, backlog):
+                print(f"Segment length: {controller.describe()}")
+    
+    def remember_segment(self, fingerprint, model, target_lang, translation):
+        """Index a finished segment's translation by its audio fingerprint"""
+        if translation:
+            self.audio_fingerprints.put(fingerprint, model, target_lang, translation)
+    
+    def timestamp_translation(self, translation):
+        """Prefix a non-empty translation with the current time"""
+        if not translation:
+            return translation
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        return f"[{timestamp}] {translation}"
+    
+    def update_processing_status(self, delta):
+        """Track in-flight segments and show whether any are being processed"""
+        with self.processing_lock:
+            self.processing_count += delta
+            busy = self.processing_count > 0
+        
+        if busy:
+            depth = self.audio_queue.qsize()
+            age = self.audio_queue.oldest_age()
+            status_text = f"● Processing... (queue {depth}, {age:.1f}s)" if depth else "● Processing..."
+            self.root.after(0, lambda: self.status_label.config(text=status_text, fg=self.colors['accent']))
+        elif self.is_translating:
+            self.root.after(0, lambda: self.status_label.config(text="● Recording & Translating", fg=self.colors['success']))
+    
+    def trim_silence(self, audio_array):
+        """Trim leading/trailing silence and optionally squeeze long inner pauses"""
+        frame_length = max(1, int(self.sample_rate * self.config.get('vad_frame_ms', 30) / 1000))
+        count = len(audio_array) // frame_length
+        if count == 0:
+            return audio_array
+        
+        energies = np.abs(audio_array[:count * frame_length].reshape(count, frame_length)).mean(axis=1)
+        if self.noise_floor is not None:
+            # Be a bit more lenient than the gate so soft word endings survive
+            speech = self.noise_floor.snr_db(energies) > self.noise_floor.speech_snr_db - 4
+        else:
+            speech = energies > self.config.get('audio_threshold', 500) * 0.5
+        speech_frames = np.flatnonzero(speech)
+        if len(speech_frames) == 0:
+            return audio_array
+        
+        padding = int(round(self.config.get('trim_padding_ms', 150) / self.config.get('vad_frame_ms', 30)))
+        first = max(0, speech_frames[0] - padding)
+        last = min(count, speech_frames[-1] + 1 + padding)
+        end = len(audio_array) if last == count else last * frame_length
+        trimmed = audio_array[first * frame_length:end]  # Still a view
+        
+        if self.config.get('squeeze_pauses', False):
+            max_pause = max(1, int(round(self.config.get('max_pause_ms', 400) / self.config.get('vad_frame_ms', 30))))
+            speech = speech[first:last]
+            # Position of each silent frame within its run of silence
+            run_start = np.maximum.accumulate(np.where(speech, np.arange(len(speech)), -1))
+            run_offset = np.arange(len(speech)) - run_start
+            keep = speech | (run_offset <= max_pause)
+            if not keep.all():
+                mask = np.repeat(keep, frame_length)
+                mask = np.concatenate([mask, np.ones(len(trimmed) - len(mask), dtype=bool)])
+                trimmed = trimmed[mask]
+        
+        saved = (len(audio_array) - len(trimmed)) * audio_array.itemsize
+        if saved:
+            self.upload_bytes_saved += saved
+            print(f"Trimmed silence: {len(audio_array) * audio_array.itemsize} -> "
+                  f"{len(trimmed) * audio_array.itemsize} bytes ({saved} saved, "
+                  f"{self.upload_bytes_saved} total)")
+        return trimmed
+    
+    def encode_wav(self, audio_array):
+        """Frame int16 samples as 16-bit PCM WAV without an intermediate copy
+
+        The 44-byte header and the PCM are written into one buffer allocated at
+        its final size, so the samples are copied exactly once (out of the ring).
+        Returns a memoryview over that buffer.
+        """
+        sample_width = self.audio.get_sample_size(self.audio_format)
+        data_size = len(audio_array) * sample_width
+        buffer = bytearray(44 + data_size)
+        struct.pack_into('<4sI4s4sIHHIIHH4sI', buffer, 0,
+                         b'RIFF', 36 + data_size, b'WAVE',
+                         b'fmt ', 16, 1, self.channels, self.sample_rate,
+                         self.sample_rate * self.channels * sample_width,
+                         self.channels * sample_width, sample_width * 8,
+                         b'data', data_size)
+        np.frombuffer(buffer, dtype=np.int16, offset=44)[:] = audio_array
+        return memoryview(buffer)
+    
+    def encode_with_soundfile(self, audio_array, file_format, subtype):
+        """Encode with libsndfile, or return None if soundfile is not installed"""
+        try:
+            import soundfile as sf
+        except ImportError:
+            print("Compressed uploads need soundfile: pip install soundfile")
+            return None
+        
+        buffer = io.BytesIO()
+        sf.write(buffer, audio_array, self.sample_rate, format=file_format, subtype=subtype)
+        return buffer.getvalue()
+    
+    def encode_flac(self, audio_array):
+        """Encode int16 samples as lossless FLAC"""
+        return self.encode_with_soundfile(audio_array, 'FLAC', 'PCM_16')
+    
+    def encode_opus(self, audio_array):
+        """Encode int16 samples as Opus in an OGG container"""
+        return self.encode_with_soundfile(audio_array, 'OGG', 'OPUS')
+    
+    def encode_mulaw(self, audio_array):
+        """Encode int16 samples as 8-bit G.711 mu-law WAV"""
+        # G.711 companding, vectorized
+        samples = audio_array.astype(np.int32)
+        sign = np.where(samples < 0, 0x80, 0)
+        magnitude = np.minimum(np.abs(samples), 32635) + 0x84
+        exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+        mantissa = (magnitude >> (exponent + 3)) & 0x0F
+        encoded = (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+        
+        # Non-PCM WAV needs the extended fmt chunk plus a fact chunk
+        data_size = len(encoded)
+        buffer = bytearray(58 + data_size)
+        struct.pack_into('<4sI4s4sIHHIIHHH4sII4sI', buffer, 0,
+                         b'RIFF', 50 + data_size, b'WAVE',
+                         b'fmt ', 18, 7, self.channels, self.sample_rate,
+                         self.sample_rate * self.channels, self.channels, 8, 0,
+                         b'fact', 4, data_size // self.channels,
+                         b'data', data_size)
+        np.frombuffer(buffer, dtype=np.uint8, offset=58)[:] = encoded
+        return memoryview(buffer)
+    
+    def upload_file(self, audio_file):
+        """Wrap encoded audio for multipart upload without copying it to bytes"""
+        filename, data, mime_type = audio_file
+        if isinstance(data, memoryview):
+            data = MemoryviewReader(data)
+        return (filename, data, mime_type)
+    
+    def get_upload_provider(self, model):
+        """Return which upload endpoint receives the audio for a model"""
+        if self.uses_native_gemini_audio(model):
+            return 'gemini'
+        if model in ('whisper-1', 'whisper-translate') or model.startswith('gemini'):
+            # Two-stage Gemini models are transcribed by Whisper before translation
+            return 'whisper'
+        return 'openai_audio'
     
-    def start_background_threads(self):
-        """Start background processing threads"""
-        # Audio processing thread
-        self.processing_thread = threading.Thread(target=self.process_audio_queue, daemon=True)
-        self.processing_thread.start()
+    def encode_audio(self, audio_array, provider):
+        """Encode a segment in the best format the provider accepts
+
+        Returns an OpenAI-style file tuple ``(filename, data, mime_type)``.
+        Falls back to WAV if the configured encoder is not accepted by the
+        provider or its library is missing.
+        """
+        accepted = self.upload_formats.get(provider, ['wav'])
+        encoding = self.config.get('upload_encoding', 'auto')
+        if encoding == 'auto':
+            encoding = accepted[0]
+        if encoding not in accepted:
+            encoding = 'wav'
         
-        # Translation display thread
-        self.display_thread = threading.Thread(target=self.update_translation_display, daemon=True)
-        self.display_thread.start()
+        encode, extension, mime_type = self.audio_encoders[encoding]
+        data = encode(audio_array)
+        if data is None:
+            encode, extension, mime_type = self.audio_encoders['wav']
+            data = encode(audio_array)
+        return (f"audio.{extension}", data, mime_type)
     
-    def process_audio_queue(self):
-        """Process audio from queue"""
-        while True:
-            try:
-                if not self.audio_queue.empty() and self.is_translating:
-                    audio_data = self.audio_queue.get()
-                    
-                    # Update status
-                    self.root.after(0, lambda: self.status_label.config(text="● Processing...", fg=self.colors['accent']))
-                    
-                    # Process with OpenAI
-                    translation = self.translate_audio(audio_data)
-                    
-                    if translation:
-                        timestamp = datetime.now().strftime("%H:%M:%S")
-                        self.translation_queue.put(f"[{timestamp}] {translation}")
-                    
-                    # Reset status
-                    if self.is_translating:
-                        self.root.after(0, lambda: self.status_label.config(text="● Recording & Translating", fg=self.colors['success']))
-                
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"Error processing audio: {e}")
-                time.sleep(1)
+    def prepare_upload(self, audio_data, selected_model):
+        """Trim a segment and encode it for the endpoint that will receive it"""
+        if self.config.get('trim_silence', True):
+            audio_data = self.trim_silence(audio_data)
+        return self.encode_audio(audio_data, self.get_upload_provider(selected_model))
+    
+    def translate_audio(self, audio_data, selected_model=None, on_partial=None):
+        """Translate audio using selected AI model; failures raise"""
+        # Get selected model and target language
+        selected_model = selected_model or self.config.get('selected_audio_model', 'gpt-4o-audio-preview')
+        target_lang = self.config.get('target_language', 'English')
+        
+        hedge_model = self.config.get('hedge_model', '')
+        if hedge_model and hedge_model != selected_model:
+            return self.hedged_translation(audio_data, selected_model, hedge_model, target_lang, on_partial)
+        return self.request_audio_translation(audio_data, selected_model, target_lang, on_partial)
+    
+    def request_audio_translation(self, audio_data, model, target_lang, on_partial=None):
+        """Translate a segment with one model, recording how long successful requests take"""
+        started = time.monotonic()
+        
+        if self.uses_local_asr(model):
+            translation = self.translate_with_local_asr(audio_data, target_lang, model, on_partial)
+            self.model_latencies[model].add(time.monotonic() - started)
+            return translation
+        
+        # Encode for the endpoint that will receive the audio
+        audio_file = self.prepare_upload(audio_data, model)
+        
+        # Handle different model types
+        if model.startswith('gemini'):
+            translation = self.translate_with_gemini(audio_file, target_lang, model, on_partial)
+        elif model == 'whisper-1':
+            translation = self.translate_with_whisper(audio_file, target_lang, on_partial)
+        elif model == 'whisper-translate':
+            translation = self.translate_with_whisper_translation(audio_file, target_lang, on_partial)
+        else:
+            translation = self.translate_with_openai_audio(audio_file, target_lang, model, on_partial)
+        
+        self.model_latencies[model].add(time.monotonic() - started)
+        return translation
+    
+    def hedge_delay(self, model):
+        """How long to wait for a model before hedging: its recent p95 (or configured) latency"""
+        delay = self.model_latencies[model].percentile(self.config.get('hedge_percentile', 95))
+        return delay if delay is not None else self.config.get('hedge_delay_seconds', 4)
     
-    def translate_audio(self, audio_data):
-        """Translate audio using selected AI model"""
+    def hedged_translation(self, audio_data, primary_model, hedge_model, target_lang, on_partial=None):
+        """Translate with the primary model, racing the hedge model if the primary is slower than usual"""
+        settled = threading.Event()
+        
+        def show_partial(text):
+            if not settled.is_set():
+                on_partial(text)
+        
+        attempts = [self.hedge_executor.submit(self.request_audio_translation, audio_data, primary_model,
+                                               target_lang, show_partial if on_partial else None)]
+        concurrent.futures.wait(attempts, timeout=self.hedge_delay(primary_model))
+        if not attempts[0].done() or attempts[0].exception() is not None:
+            # The hedge doesn't stream; the primary's partial line stays until a result wins
+            attempts.append(self.hedge_executor.submit(self.request_audio_translation, audio_data,
+                                                       hedge_model, target_lang))
+            self.hedges_sent += 1
+        
         try:
-            # Convert audio to WAV format
-            wav_buffer = io.BytesIO()
-            with wave.open(wav_buffer, 'wb') as wav_file:
-                wav_file.setnchannels(self.channels)
-                wav_file.setsampwidth(self.audio.get_sample_size(self.audio_format))
-                wav_file.setframerate(self.sample_rate)
-                wav_file.writeframes(audio_data)
-            
-            wav_buffer.seek(0)
-            wav_data = wav_buffer.read()
-            
-            # Get selected model and target language
-            selected_model = self.config.get('selected_audio_model', 'gpt-4o-audio-preview')
-            target_lang = self.config.get('target_language', 'English')
-            
-            # Handle different model types
-            if selected_model.startswith('gemini'):
-                return self.translate_with_gemini(wav_data, target_lang, selected_model)
-            elif selected_model == 'whisper-1':
-                return self.translate_with_whisper(wav_data, target_lang)
+            pending = set(attempts)
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for attempt in attempts:
+                    if attempt in done and attempt.exception() is None:
+                        if attempt is not attempts[0]:
+                            self.hedges_won += 1
+                        return attempt.result()
+            # Both failed: raise the primary's error
+            return attempts[0].result()
+        finally:
+            # A losing request can't be cancelled mid-flight; it ends at its timeout
+            settled.set()
+    
+    def error_message(self, error):
+        """The text shown in place of a segment whose translation failed"""
+        if isinstance(error, TranslationError):
+            return str(error)
+        return f"Translation error: {str(error)}"
+    
+    def is_transient_error(self, error):
+        """Whether a provider error is worth retrying (timeouts, dropped connections, 429 and 5xx)"""
+        if isinstance(error, (APIConnectionError, TimeoutError, ConnectionError)):
+            return True
+        # OpenAI errors carry status_code, Google API errors an HTTP code
+        status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+        return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+    
+    def retry_delay(self, attempt):
+        """Exponential backoff with full jitter so retries from several workers spread out"""
+        cap = self.config.get('retry_backoff_max_seconds', 8)
+        return random.uniform(0, min(cap, self.config.get('retry_backoff_seconds', 0.5) * 2 ** attempt))
+    
+    def call_provider(self, provider, request, can_retry=None):
+        """Run a provider request behind its circuit breaker, retrying transient errors
+
+        ``can_retry`` is checked before each retry; streamed requests use it
+        so text that was already shown is not repeated.
+        """
+        breaker = self.circuit_breakers[provider]
+        retries = max(0, int(self.config.get('provider_max_retries', 2)))
+        for attempt in itertools.count():
+            if not breaker.allow():
+                raise ProviderUnavailableError(f"{breaker.name} is failing; requests paused")
+            try:
+                result = request()
+            except Exception as e:
+                if not self.is_transient_error(e):
+                    breaker.record_success()  # The provider answered; the request itself was bad
+                    raise
+                breaker.record_failure()
+                if attempt >= retries or (can_retry and not can_retry()):
+                    raise
+                delay = self.retry_delay(attempt)
+                print(f"{breaker.name} request failed ({e}); retry {attempt + 1} of {retries} in {delay:.1f}s")
+                time.sleep(delay)
+            except BaseException:
+                breaker.release_probe()  # Interrupted before an answer; neither success nor failure
+                raise
             else:
-                return self.translate_with_openai_audio(wav_data, target_lang, selected_model)
-            
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return f"Translation error: {str(e)}"
+                breaker.record_success()
+                return result
     
-    def translate_with_openai_audio(self, wav_data, target_lang, model):
-        """Translate using OpenAI audio models"""
-        try:
-            # Encode to base64
-            encoded_audio = base64.b64encode(wav_data).decode('utf-8')
-            
-            # Create enhanced prompt for translation with language detection
-            prompt = f"""Listen to this audio and:
+    def gemini_request_options(self):
+        return {'timeout': self.config.get('gemini_timeout_seconds', 20)}
+    
+    def build_audio_prompt(self, target_lang):
+        """Build the prompt for a structured audio translation request"""
+        # Create enhanced prompt for translation with language detection
+        return f"""Listen to this audio and:
 1. Detect the source language with confidence level
 2. Transcribe what you hear
 3. Translate it to {target_lang}
@@ -783,43 +3928,175 @@ ORIGINAL: [transcribed text]
 TRANSLATED: [translation to {target_lang}]
 
 If there's no clear speech, respond with 'No speech detected'."""
-            
-            # Call OpenAI API
-            completion = self.client.chat.completions.create(
-                model=model,
-                modalities=["text"],
-                messages=[
+    
+    def build_audio_messages(self, audio_file, target_lang):
+        """Build the chat messages for a structured audio translation request"""
+        # Encode to base64
+        filename, audio_bytes, _ = audio_file
+        encoded_audio = base64.b64encode(audio_bytes).decode('utf-8')
+        
+        return [
+            {
+                "role": "user",
+                "content": [
                     {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "input_audio",
-                                "input_audio": {
-                                    "data": encoded_audio,
-                                    "format": "wav"
-                                }
-                            }
-                        ]
+                        "type": "text",
+                        "text": self.build_audio_prompt(target_lang)
+                    },
+                    {
+                        "type": "input_audio",
+                        "input_audio": {
+                            "data": encoded_audio,
+                            "format": filename.rsplit('.', 1)[1]
+                        }
                     }
                 ]
+            }
+        ]
+    
+    def build_gemini_audio_contents(self, audio_file, target_lang):
+        """Build the contents of a structured audio translation request with the audio inline"""
+        _, audio_bytes, mime_type = audio_file
+        return [self.build_audio_prompt(target_lang), {'mime_type': mime_type, 'data': bytes(audio_bytes)}]
+    
+    def handle_audio_response(self, response, target_lang):
+        """Filter empty results and parse a structured audio translation response"""
+        # Filter out "No speech detected" responses
+        if "no speech detected" in response.lower() or "no clear speech" in response.lower():
+            return None
+        
+        # Parse the structured response
+        return self.parse_openai_audio_response(response, target_lang)
+    
+    def build_text_translation_prompt(self, original_text, target_lang, context=''):
+        """Build the prompt used to translate a transcript (optionally the continuation of ``context``)"""
+        if context:
+            return (f"This text continues a sentence that began: \"{context[-300:]}\". Translate only the "
+                    f"continuation to {target_lang}. If it's already in {target_lang}, just return it: {original_text}")
+        return f"Translate this text to {target_lang}. If it's already in {target_lang}, just return the original text: {original_text}"
+    
+    def build_batch_translation_prompt(self, texts, target_lang):
+        """Build the prompt used to translate several transcripts in one request"""
+        return (f"Translate each text in this JSON array to {target_lang}. If a text is already in {target_lang}, "
+                f"keep it unchanged. Reply with only a JSON array of the translations, in the same order:\n"
+                f"{json.dumps(texts, ensure_ascii=False)}")
+    
+    def split_cached_transcripts(self, transcripts, target_lang, model):
+        """Answer cached transcripts of a batch; returns (results, indices still to translate)"""
+        results = [None] * len(transcripts)
+        pending = []
+        for index, (original_text, detected_lang, confidence) in enumerate(transcripts):
+            translated_text = self.translation_cache.get(original_text, detected_lang, target_lang, model)
+            if translated_text is None:
+                pending.append(index)
+            else:
+                results[index] = self.format_translation_with_detection(
+                    original_text, translated_text, detected_lang, target_lang, confidence)
+        return results, pending
+    
+    def finish_batch_translation(self, transcripts, results, pending, response, target_lang, model):
+        """Split a batched reply back onto its transcripts; False if it does not line up"""
+        # Models sometimes wrap the array in a code fence or a sentence
+        match = re.search(r'\[.*\]', response, re.DOTALL)
+        try:
+            translations = json.loads(match.group(0)) if match else None
+        except ValueError:
+            translations = None
+        if not isinstance(translations, list) or len(translations) != len(pending):
+            print(f"Batched translation returned an unexpected reply; translating {len(pending)} transcripts one by one")
+            return False
+        
+        self.apply_batch_translations(transcripts, results, pending, translations, target_lang, model)
+        return True
+    
+    def apply_batch_translations(self, transcripts, results, pending, translations, target_lang, model):
+        """Cache and format the translations of the pending transcripts into results"""
+        for index, translated_text in zip(pending, translations):
+            original_text, detected_lang, confidence = transcripts[index]
+            translated_text = str(translated_text).strip()
+            self.translation_cache.put(original_text, detected_lang, target_lang, model, translated_text)
+            results[index] = self.format_translation_with_detection(
+                original_text, translated_text, detected_lang, target_lang, confidence)
+    
+    def structured_delta_handler(self, on_partial, target_lang):
+        """Turn streamed structured-response deltas into partial display updates"""
+        if not on_partial:
+            return None
+        parser = StreamingFieldParser()
+        
+        def on_delta(delta):
+            fields = parser.feed(delta)
+            if 'ORIGINAL' in fields:
+                on_partial(self.format_partial_translation(fields['ORIGINAL'], fields.get('TRANSLATED', ''), target_lang))
+        return on_delta
+    
+    def text_delta_handler(self, on_partial, original_text, target_lang):
+        """Turn streamed translation deltas into partial display updates"""
+        if not on_partial:
+            return None
+        parts = []
+        
+        def on_delta(delta):
+            parts.append(delta)
+            on_partial(self.format_partial_translation(original_text, ''.join(parts), target_lang))
+        return on_delta
+    
+    def complete_chat(self, on_delta=None, **request):
+        """Run a chat completion and return its text
+
+        With ``on_delta`` the completion is streamed and every token delta is
+        passed on as it arrives.
+        """
+        if not on_delta:
+            completion = self.call_provider('openai', lambda: self.client.chat.completions.create(**request))
+            return completion.choices[0].message.content
+        
+        parts = []
+        
+        def stream():
+            for chunk in self.client.chat.completions.create(stream=True, **request):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    on_delta(parts[-1])
+            return ''.join(parts)
+        
+        # Once text has been shown, a retry would repeat it
+        return self.call_provider('openai', stream, can_retry=lambda: not parts)
+    
+    def generate_gemini_text(self, prompt, on_delta=None):
+        """Run a Gemini generation (text prompt or contents list), streaming deltas to ``on_delta`` if given"""
+        if not on_delta:
+            return self.call_provider('gemini', lambda: self.gemini_client.generate_content(
+                prompt, request_options=self.gemini_request_options())).text
+        
+        parts = []
+        
+        def stream():
+            for chunk in self.gemini_client.generate_content(prompt, stream=True,
+                                                             request_options=self.gemini_request_options()):
+                parts.append(chunk.text)
+                on_delta(parts[-1])
+            return ''.join(parts)
+        
+        # Once text has been shown, a retry would repeat it
+        return self.call_provider('gemini', stream, can_retry=lambda: not parts)
+    
+    def translate_with_openai_audio(self, audio_file, target_lang, model, on_partial=None):
+        """Translate using OpenAI audio models"""
+        try:
+            # Call OpenAI API
+            response = self.complete_chat(
+                self.structured_delta_handler(on_partial, target_lang),
+                model=model,
+                modalities=["text"],
+                messages=self.build_audio_messages(audio_file, target_lang)
             )
             
-            response = completion.choices[0].message.content
-            
-            # Filter out "No speech detected" responses
-            if "no speech detected" in response.lower() or "no clear speech" in response.lower():
-                return None
-            
-            # Parse the structured response
-            return self.parse_openai_audio_response(response, target_lang)
+            return self.handle_audio_response(response, target_lang)
             
         except Exception as e:
             if "does not exist" in str(e) or "model_not_found" in str(e):
-                return f"Model '{model}' not available. Try GPT-4o Audio Preview or Whisper-1."
+                raise TranslationError(f"Model '{model}' not available. Try GPT-4o Audio Preview or Whisper-1.") from e
             raise e
     
     def parse_openai_audio_response(self, response, target_lang):
@@ -854,77 +4131,521 @@ If there's no clear speech, respond with 'No speech detected'."""
             print(f"Parsing error: {e}")
             return f"🌐 Translation: {response}\n-------------------------"
     
-    def translate_with_whisper(self, wav_data, target_lang):
+    def transcribe_audio(self, audio_file):
+        """Transcribe with Whisper; returns (text, language, confidence) or None if there is no speech"""
+        transcription = self.call_provider('openai', lambda: self.client.audio.transcriptions.create(
+            model="whisper-1",
+            file=self.upload_file(audio_file),
+            response_format="verbose_json"
+        ))
+        return self.build_transcript(transcription)
+    
+    def translate_transcript(self, transcript, target_lang, model, on_partial=None):
+        """Translate a (text, language, confidence) transcript with the text model for the audio model"""
+        original_text, detected_lang, confidence = transcript
+        try:
+            translated_text = self.translate_text(original_text, detected_lang, target_lang, model,
+                                                  self.text_delta_handler(on_partial, original_text, target_lang))
+        except Exception as e:
+            if model.startswith('gemini') and "API_KEY_INVALID" in str(e):
+                raise TranslationError("Invalid Gemini API key. Please check your configuration.") from e
+            raise e
+        
+        # Format with language detection
+        return self.format_translation_with_detection(original_text, translated_text, detected_lang, target_lang, confidence)
+    
+    def translate_text(self, original_text, detected_lang, target_lang, model, on_delta=None, context=''):
+        """Translate text with the text model for the audio model and return the translation
+
+        ``context`` is the source text just before it in the same sentence; it only
+        steers the translation, and results that depend on it are not cached.
+        """
+        # Repeated phrases skip the MT call entirely
+        if not context:
+            translated_text = self.translation_cache.get(original_text, detected_lang, target_lang, model)
+            if translated_text is not None:
+                return translated_text
+        
+        prompt = self.build_text_translation_prompt(original_text, target_lang, context)
+        if self.uses_local_mt(model):
+            # Fast enough on the CPU that partial results aren't worth streaming
+            translated_text = self.translate_locally([original_text], [detected_lang], target_lang)[0]
+        elif model.startswith('gemini'):
+            # Translate with Gemini
+            translated_text = self.generate_gemini_text(prompt, on_delta)
+        else:
+            # Translate the transcribed text
+            translated_text = self.complete_chat(
+                on_delta,
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            )
+        
+        if not context:
+            self.translation_cache.put(original_text, detected_lang, target_lang, model, translated_text)
+        return translated_text
+    
+    def translate_transcript_batch(self, transcripts, target_lang, model):
+        """Translate several transcripts with one text model request, in order"""
+        results, pending = self.split_cached_transcripts(transcripts, target_lang, model)
+        if not pending:
+            return results
+        
+        if self.uses_local_mt(model):
+            texts = [transcripts[index][0] for index in pending]
+            languages = [transcripts[index][1] for index in pending]
+            translations = self.translate_locally(texts, languages, target_lang)
+            self.apply_batch_translations(transcripts, results, pending, translations, target_lang, model)
+            return results
+        
+        prompt = self.build_batch_translation_prompt([transcripts[index][0] for index in pending], target_lang)
+        if model.startswith('gemini'):
+            try:
+                response = self.generate_gemini_text(prompt)
+            except Exception as e:
+                if "API_KEY_INVALID" in str(e):
+                    raise TranslationError("Invalid Gemini API key. Please check your configuration.") from e
+                raise e
+        else:
+            response = self.complete_chat(
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            )
+        
+        if not self.finish_batch_translation(transcripts, results, pending, response, target_lang, model):
+            for index in pending:
+                results[index] = self.translate_transcript(transcripts[index], target_lang, model)
+        return results
+    
+    def translate_with_whisper(self, audio_file, target_lang, on_partial=None):
         """Translate using Whisper transcription + GPT translation"""
+        transcript = self.transcribe_audio(audio_file)
+        if not transcript:
+            return None
+        return self.translate_transcript(transcript, target_lang, 'whisper-1', on_partial)
+    
+    def translate_with_whisper_translation(self, audio_file, target_lang, on_partial=None):
+        """Translate to English in one request with Whisper's translation endpoint"""
+        if target_lang != 'English':
+            # The endpoint only produces English
+            return self.translate_with_whisper(audio_file, target_lang, on_partial)
+        
+        translation = self.call_provider('openai', lambda: self.client.audio.translations.create(
+            model="whisper-1",
+            file=self.upload_file(audio_file),
+            response_format="verbose_json"
+        ))
+        return self.format_direct_translation(translation)
+    
+    def format_direct_translation(self, translation):
+        """Format a Whisper translation, which comes without a source-language transcript"""
+        translated_text = translation.text.strip()
+        if not translated_text:
+            return None
+        target_flag, target_name = self.get_language_flag_and_name('English')
+        return f"🌐 (Auto-detected) → {target_flag} ({target_name}): {translated_text}\n-------------------------"
+    
+    def check_two_stage_clients(self, model):
+        """Raise TranslationError if a Whisper/Gemini model is missing a client"""
+        if self.is_offline_model(model):
+            return
+        if model.startswith('gemini') and not self.gemini_client and not self.uses_local_mt(model):
+            raise TranslationError("Gemini API key not configured")
+        if not self.client:
+            if model == 'local-whisper':
+                raise TranslationError("OpenAI API key needed to translate local transcripts")
+            if not self.uses_local_asr(model):
+                raise TranslationError(f"OpenAI API key needed for audio transcription with {model}")
+    
+    def uses_local_asr(self, model):
+        """Whether a model's transcription runs on the local Whisper model"""
+        return model in ('local-whisper', 'local-offline') or (model.startswith('gemini') and
+                                                               self.config.get('asr_backend', 'openai') == 'local')
+    
+    def uses_local_mt(self, model):
+        """Whether a two-stage model's text translation runs on the local translation model"""
+        return model == 'local-offline' or (self.is_two_stage_model(model) and
+                                            self.config.get('mt_backend', 'cloud') == 'local')
+    
+    def is_offline_model(self, model):
+        """Whether a model needs no API key at all"""
+        return self.uses_local_asr(model) and self.uses_local_mt(model)
+    
+    def translate_locally(self, texts, languages, target_lang):
+        """Translate transcripts on the local model; languages are the detected language codes"""
+        sources = []
+        for text, detected_lang in zip(texts, languages):
+            source = self.get_language_flag_and_name(detected_lang)[1]
+            if not self.local_translator.language_code(source):
+                source = self.get_language_flag_and_name(self.detect_language_from_text(text)[0])[1]
+            sources.append(source)
+        return self.local_translator.translate(texts, sources, target_lang)
+    
+    def transcribe_locally(self, audio_data):
+        """Transcribe on the local Whisper model; returns (text, language, confidence) or None"""
+        if self.config.get('trim_silence', True):
+            audio_data = self.trim_silence(audio_data)
+        text, detected_lang, probability = self.local_asr.transcribe(audio_data)
+        if not text:
+            return None
+        return text, detected_lang, self.estimate_language_confidence(text, detected_lang, probability)
+    
+    def translate_with_local_asr(self, audio_data, target_lang, model, on_partial=None):
+        """Transcribe locally, then translate with the text model that goes with the audio model"""
+        self.check_two_stage_clients(model)
+        
+        transcript = self.transcribe_locally(audio_data)
+        if not transcript:
+            return None
+        return self.translate_transcript(transcript, target_lang, model, on_partial)
+    
+    def translate_with_gemini(self, audio_file, target_lang, model, on_partial=None):
+        """Translate using Gemini models"""
+        if self.uses_native_gemini_audio(model):
+            return self.translate_with_gemini_audio(audio_file, target_lang, on_partial)
+        
+        # First transcribe with Whisper (if available), then translate with Gemini
+        self.check_two_stage_clients(model)
+        
+        transcript = self.transcribe_audio(audio_file)
+        if not transcript:
+            return None
+        return self.translate_transcript(transcript, target_lang, model, on_partial)
+    
+    def translate_with_gemini_audio(self, audio_file, target_lang, on_partial=None):
+        """Transcribe and translate in one Gemini request with the audio inline"""
+        if not self.gemini_client:
+            raise TranslationError("Gemini API key not configured")
+        try:
+            response = self.generate_gemini_text(self.build_gemini_audio_contents(audio_file, target_lang),
+                                                 self.structured_delta_handler(on_partial, target_lang))
+        except Exception as e:
+            if "API_KEY_INVALID" in str(e):
+                raise TranslationError("Invalid Gemini API key. Please check your configuration.") from e
+            raise e
+        return self.handle_audio_response(response, target_lang)
+    
+    def uses_native_gemini_audio(self, model):
+        """Whether a Gemini model gets the audio itself instead of a Whisper transcript"""
+        return (model.startswith('gemini') and self.config.get('gemini_audio_mode', 'native') == 'native' and
+                self.config.get('asr_backend', 'openai') != 'local')
+    
+    def is_two_stage_model(self, model):
+        """Whether a model runs as separate transcription and translation calls"""
+        return (model in ('whisper-1', 'local-whisper', 'local-offline') or
+                (model.startswith('gemini') and not self.uses_native_gemini_audio(model)))
+    
+    def transcribe_segment(self, audio_data, selected_model):
+        """ASR stage of the pipelined path
+
+        Returns (text, language, confidence) or None if there is no speech; failures raise.
+        """
+        self.check_two_stage_clients(selected_model)
+        if self.uses_local_asr(selected_model):
+            return self.transcribe_locally(audio_data)
+        return self.transcribe_audio(self.prepare_upload(audio_data, selected_model))
+    
+    async def atranslate_audio(self, audio_data, selected_model=None, on_partial=None):
+        """Async counterpart of translate_audio used by the asyncio engine"""
+        selected_model = selected_model or self.config.get('selected_audio_model', 'gpt-4o-audio-preview')
+        target_lang = self.config.get('target_language', 'English')
+        
+        hedge_model = self.config.get('hedge_model', '')
+        if hedge_model and hedge_model != selected_model:
+            return await self.ahedged_translation(audio_data, selected_model, hedge_model, target_lang, on_partial)
+        return await self.arequest_audio_translation(audio_data, selected_model, target_lang, on_partial)
+    
+    async def arequest_audio_translation(self, audio_data, model, target_lang, on_partial=None):
+        """Async counterpart of request_audio_translation"""
+        started = time.monotonic()
+        if self.uses_local_asr(model):
+            translation = await self.atranslate_with_local_asr(audio_data, target_lang, model, on_partial)
+            self.model_latencies[model].add(time.monotonic() - started)
+            return translation
+        
+        # Trimming and encoding are CPU work; keep them off the event loop
+        audio_file = await asyncio.get_running_loop().run_in_executor(None, self.prepare_upload, audio_data, model)
+        
+        if model.startswith('gemini'):
+            translation = await self.atranslate_with_gemini(audio_file, target_lang, model, on_partial)
+        elif model == 'whisper-1':
+            translation = await self.atranslate_with_whisper(audio_file, target_lang, on_partial)
+        elif model == 'whisper-translate':
+            translation = await self.atranslate_with_whisper_translation(audio_file, target_lang, on_partial)
+        else:
+            translation = await self.atranslate_with_openai_audio(audio_file, target_lang, model, on_partial)
+        
+        self.model_latencies[model].add(time.monotonic() - started)
+        return translation
+    
+    async def ahedged_translation(self, audio_data, primary_model, hedge_model, target_lang, on_partial=None):
+        """Async counterpart of hedged_translation; the losing request is cancelled"""
+        settled = False
+        
+        def show_partial(text):
+            if not settled:
+                on_partial(text)
+        
+        attempts = [asyncio.ensure_future(self.arequest_audio_translation(
+            audio_data, primary_model, target_lang, show_partial if on_partial else None))]
+        await asyncio.wait(attempts, timeout=self.hedge_delay(primary_model))
+        if not attempts[0].done() or attempts[0].exception() is not None:
+            attempts.append(asyncio.ensure_future(self.arequest_audio_translation(audio_data, hedge_model, target_lang)))
+            self.hedges_sent += 1
+        
+        try:
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in attempts:
+                    if attempt in done and attempt.exception() is None:
+                        if attempt is not attempts[0]:
+                            self.hedges_won += 1
+                        return attempt.result()
+            return attempts[0].result()
+        finally:
+            settled = True
+            for attempt in attempts:
+                attempt.cancel()
+    
+    async def acall_provider(self, provider, request, can_retry=None):
+        """Async counterpart of call_provider; ``request`` returns an awaitable"""
+        breaker = self.circuit_breakers[provider]
+        retries = max(0, int(self.config.get('provider_max_retries', 2)))
+        for attempt in itertools.count():
+            if not breaker.allow():
+                raise ProviderUnavailableError(f"{breaker.name} is failing; requests paused")
+            try:
+                result = await request()
+            except Exception as e:
+                if not self.is_transient_error(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt >= retries or (can_retry and not can_retry()):
+                    raise
+                delay = self.retry_delay(attempt)
+                print(f"{breaker.name} request failed ({e}); retry {attempt + 1} of {retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                breaker.release_probe()  # Cancelled (lost hedge, timeout or shutdown) before an answer
+                raise
+            else:
+                breaker.record_success()
+                return result
+    
+    async def acomplete_chat(self, on_delta=None, **request):
+        """Async counterpart of complete_chat"""
+        if not on_delta:
+            completion = await self.acall_provider('openai', lambda: self.async_client.chat.completions.create(**request))
+            return completion.choices[0].message.content
+        
+        parts = []
+        
+        async def stream():
+            async for chunk in await self.async_client.chat.completions.create(stream=True, **request):
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    on_delta(parts[-1])
+            return ''.join(parts)
+        
+        return await self.acall_provider('openai', stream, can_retry=lambda: not parts)
+    
+    async def agenerate_gemini_text(self, prompt, on_delta=None):
+        """Async counterpart of generate_gemini_text"""
+        if not on_delta:
+            response = await self.acall_provider('gemini', lambda: self.gemini_client.generate_content_async(
+                prompt, request_options=self.gemini_request_options()))
+            return response.text
+        
+        parts = []
+        
+        async def stream():
+            async for chunk in await self.gemini_client.generate_content_async(
+                    prompt, stream=True, request_options=self.gemini_request_options()):
+                parts.append(chunk.text)
+                on_delta(parts[-1])
+            return ''.join(parts)
+        
+        return await self.acall_provider('gemini', stream, can_retry=lambda: not parts)
+    
+    async def atranslate_with_openai_audio(self, audio_file, target_lang, model, on_partial=None):
+        """Translate using OpenAI audio models (async)"""
         try:
-            # Use Whisper for transcription
-            transcription = self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=("audio.wav", wav_data, "audio/wav"),
-                response_format="verbose_json"
+            response = await self.acomplete_chat(
+                self.structured_delta_handler(on_partial, target_lang),
+                model=model,
+                modalities=["text"],
+                messages=self.build_audio_messages(audio_file, target_lang)
             )
             
-            if transcription.text.strip():
-                original_text = transcription.text.strip()
-                
-                # Detect source language
-                detected_lang = getattr(transcription, 'language', 'unknown')
-                
-                # Translate the transcribed text
-                translation_response = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {
-                            "role": "user", 
-                            "content": f"Translate this text to {target_lang}. If it's already in {target_lang}, just return the original text: {original_text}"
-                        }
-                    ]
-                )
-                translated_text = translation_response.choices[0].message.content
-                
-                # Format with language detection
-                return self.format_translation_with_detection(original_text, translated_text, detected_lang, target_lang)
-            else:
-                return None
-                
+            return self.handle_audio_response(response, target_lang)
+            
         except Exception as e:
+            if "does not exist" in str(e) or "model_not_found" in str(e):
+                raise TranslationError(f"Model '{model}' not available. Try GPT-4o Audio Preview or Whisper-1.") from e
             raise e
     
-    def translate_with_gemini(self, wav_data, target_lang, model):
-        """Translate using Gemini models"""
+    async def atranscribe(self, audio_file):
+        """Transcribe with Whisper (async); returns (text, language, confidence) or None"""
+        transcription = await self.acall_provider('openai', lambda: self.async_client.audio.transcriptions.create(
+            model="whisper-1",
+            file=self.upload_file(audio_file),
+            response_format="verbose_json"
+        ))
+        return self.build_transcript(transcription)
+    
+    async def atranslate_transcript(self, transcript, target_lang, model, on_partial=None):
+        """Translate a transcript with the text model that goes with the audio model (async)"""
+        original_text, detected_lang, confidence = transcript
+        
+        # A memory miss reads the SQLite tier
+        translated_text = await asyncio.get_running_loop().run_in_executor(
+            None, self.translation_cache.get, original_text, detected_lang, target_lang, model)
+        if translated_text is not None:
+            return self.format_translation_with_detection(original_text, translated_text, detected_lang, target_lang, confidence)
+        
+        prompt = self.build_text_translation_prompt(original_text, target_lang)
+        on_delta = self.text_delta_handler(on_partial, original_text, target_lang)
+        if self.uses_local_mt(model):
+            translated_text = (await self.atranslate_locally([original_text], [detected_lang], target_lang))[0]
+        elif model.startswith('gemini'):
+            try:
+                translated_text = await self.agenerate_gemini_text(prompt, on_delta)
+            except Exception as e:
+                if "API_KEY_INVALID" in str(e):
+                    raise TranslationError("Invalid Gemini API key. Please check your configuration.") from e
+                raise e
+        else:
+            translated_text = await self.acomplete_chat(
+                on_delta,
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            )
+        
+        self.translation_cache.put(original_text, detected_lang, target_lang, model, translated_text)
+        return self.format_translation_with_detection(original_text, translated_text, detected_lang, target_lang, confidence)
+    
+    async def atranslate_transcript_batch(self, transcripts, target_lang, model):
+        """Async counterpart of translate_transcript_batch"""
+        results, pending = await asyncio.get_running_loop().run_in_executor(
+            None, self.split_cached_transcripts, transcripts, target_lang, model)
+        if not pending:
+            return results
+        
+        if self.uses_local_mt(model):
+            texts = [transcripts[index][0] for index in pending]
+            languages = [transcripts[index][1] for index in pending]
+            translations = await self.atranslate_locally(texts, languages, target_lang)
+            self.apply_batch_translations(transcripts, results, pending, translations, target_lang, model)
+            return results
+        
+        prompt = self.build_batch_translation_prompt([transcripts[index][0] for index in pending], target_lang)
+        if model.startswith('gemini'):
+            try:
+                response = await self.agenerate_gemini_text(prompt)
+            except Exception as e:
+                if "API_KEY_INVALID" in str(e):
+                    raise TranslationError("Invalid Gemini API key. Please check your configuration.") from e
+                raise e
+        else:
+            response = await self.acomplete_chat(
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            )
+        
+        if not self.finish_batch_translation(transcripts, results, pending, response, target_lang, model):
+            for index in pending:
+                results[index] = await self.atranslate_transcript(transcripts[index], target_lang, model)
+        return results
+    
+    async def atranslate_with_whisper(self, audio_file, target_lang, on_partial=None):
+        """Translate using Whisper transcription + GPT translation (async)"""
+        transcript = await self.atranscribe(audio_file)
+        if not transcript:
+            return None
+        return await self.atranslate_transcript(transcript, target_lang, 'whisper-1', on_partial)
+    
+    async def atranslate_with_whisper_translation(self, audio_file, target_lang, on_partial=None):
+        """Translate to English in one Whisper request (async)"""
+        if target_lang != 'English':
+            return await self.atranslate_with_whisper(audio_file, target_lang, on_partial)
+        
+        translation = await self.acall_provider('openai', lambda: self.async_client.audio.translations.create(
+            model="whisper-1",
+            file=self.upload_file(audio_file),
+            response_format="verbose_json"
+        ))
+        return self.format_direct_translation(translation)
+    
+    async def atranslate_with_local_asr(self, audio_data, target_lang, model, on_partial=None):
+        """Transcribe locally in a worker thread, then translate (async)"""
+        self.check_two_stage_clients(model)
+        
+        transcript = await asyncio.get_running_loop().run_in_executor(None, self.transcribe_locally, audio_data)
+        if not transcript:
+            return None
+        return await self.atranslate_transcript(transcript, target_lang, model, on_partial)
+    
+    async def atranslate_locally(self, texts, languages, target_lang):
+        """translate_locally in a worker thread, off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.translate_locally, texts, languages, target_lang)
+    
+    async def atranslate_with_gemini(self, audio_file, target_lang, model, on_partial=None):
+        """Translate using Gemini models (async)"""
+        if self.uses_native_gemini_audio(model):
+            return await self.atranslate_with_gemini_audio(audio_file, target_lang, on_partial)
+        
+        self.check_two_stage_clients(model)
+        
+        transcript = await self.atranscribe(audio_file)
+        if not transcript:
+            return None
+        return await self.atranslate_transcript(transcript, target_lang, model, on_partial)
+    
+    async def atranslate_with_gemini_audio(self, audio_file, target_lang, on_partial=None):
+        """Transcribe and translate in one Gemini request with the audio inline (async)"""
+        if not self.gemini_client:
+            raise TranslationError("Gemini API key not configured")
         try:
-            if not self.gemini_client:
-                return "Gemini API key not configured"
-            
-            # First transcribe with Whisper (if available), then translate with Gemini
-            if self.client:
-                # Use Whisper for transcription
-                transcription = self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=("audio.wav", wav_data, "audio/wav"),
-                    response_format="verbose_json"
-                )
-                
-                if transcription.text.strip():
-                    original_text = transcription.text.strip()
-                    detected_lang = getattr(transcription, 'language', 'unknown')
-                    
-                    # Translate with Gemini
-                    prompt = f"Translate this text to {target_lang}. If it's already in {target_lang}, just return the original text: {original_text}"
-                    response = self.gemini_client.generate_content(prompt)
-                    translated_text = response.text
-                    
-                    # Format with language detection
-                    return self.format_translation_with_detection(original_text, translated_text, detected_lang, target_lang)
-                else:
-                    return None
-            else:
-                return "OpenAI API key needed for audio transcription with Gemini models"
-                
+            response = await self.agenerate_gemini_text(self.build_gemini_audio_contents(audio_file, target_lang),
+                                                        self.structured_delta_handler(on_partial, target_lang))
         except Exception as e:
             if "API_KEY_INVALID" in str(e):
-                return "Invalid Gemini API key. Please check your configuration."
+                raise TranslationError("Invalid Gemini API key. Please check your configuration.") from e
             raise e
+        return self.handle_audio_response(response, target_lang)
+    
+    async def atranscribe_segment(self, audio_data, selected_model):
+        """ASR stage of the pipelined path (async); same results as transcribe_segment"""
+        self.check_two_stage_clients(selected_model)
+        if self.uses_local_asr(selected_model):
+            # CPU-bound; keep it off the event loop
+            return await asyncio.get_running_loop().run_in_executor(None, self.transcribe_locally, audio_data)
+        audio_file = await asyncio.get_running_loop().run_in_executor(
+            None, self.prepare_upload, audio_data, selected_model)
+        return await self.atranscribe(audio_file)
     
     def format_translation_with_detection(self, original_text, translated_text, detected_lang, target_lang, confidence=None):
         """Format translation with language detection info"""
@@ -935,9 +4656,9 @@ If there's no clear speech, respond with 'No speech detected'."""
             # Get target language info
             target_flag, target_name = self.get_language_flag_and_name(target_lang)
             
-            # Use provided confidence or detect it
+            # Use provided confidence or estimate it locally
             if confidence is None:
-                _, confidence = self.detect_language_from_text(original_text)
+                confidence = self.estimate_language_confidence(original_text, detected_lang)
             
             # Format the translation
             formatted = f"{source_flag} ({source_name} - {confidence}%): {original_text}\n"
@@ -951,31 +4672,121 @@ If there's no clear speech, respond with 'No speech detected'."""
             return f"Original: {original_text}\nTranslated: {translated_text}\n-------------------------"
     
     def update_translation_display(self):
-        """Update translation display"""
+        """Update translation display in spoken order"""
+        reorder_buffer = SequenceReorderBuffer()
         while True:
             try:
-                if not self.translation_queue.empty():
-                    translation = self.translation_queue.get()
-                    
-                    # Update GUI in main thread
-                    self.root.after(0, lambda t=translation: self.add_translation_to_display(t))
+                sequence, translation = self.translation_queue.get()
                 
-                time.sleep(0.1)
+                for ready_sequence, ready in reorder_buffer.add(sequence, (sequence, translation)):
+                    self.show_final_translation(ready_sequence, ready)
                 
             except Exception as e:
                 print(f"Display update error: {e}")
-                time.sleep(1)
     
-    def add_translation_to_display(self, translation):
+    def show_final_translation(self, sequence, translation):
+        """Schedule a segment's final result (or removal of its partial) on the GUI thread"""
+        if translation:
+            self.root.after(0, lambda: self.add_translation_to_display(translation, sequence))
+        else:
+            self.root.after(0, lambda: self.discard_partial_translation(sequence))
+    
+    def make_partial_callback(self, sequence):
+        """Return a throttled callback that shows streamed text for a segment, or None"""
+        if not self.config.get('stream_partial_results', True):
+            return None
+        last_update = [0.0]
+        
+        def show(text):
+            now = time.monotonic()
+            if now - last_update[0] < 0.05:
+                return
+            last_update[0] = now
+            self.root.after(0, lambda: self.show_partial_translation(sequence, text))
+        return show
+    
+    def format_partial_translation(self, original_text, translated_text, target_lang):
+        """Format an in-progress translation"""
+        target_flag, target_name = self.get_language_flag_and_name(target_lang)
+        return f"⏳ {original_text}\n{target_flag} ({target_name}): {translated_text}"
+    
+    def get_display_widgets(self):
+        """Return the main and (if open) mini translation text widgets"""
+        widgets = [self.translation_text]
+        if self.is_minimized and self.minimized_window and hasattr(self.minimized_window, 'translation_text'):
+            widgets.append(self.minimized_window.translation_text)
+        return widgets
+    
+    def place_segment_text(self, widget, sequence, text, partial):
+        """Insert or replace a segment's block of text in a display widget
+
+        In-progress blocks are tagged ``partial_<sequence>`` so they can be
+        rewritten in place; a final block replaces its partial, or goes before
+        partials of later segments so spoken order is kept.
+        """
+        tag = f"partial_{sequence}"
+        ranges = widget.tag_ranges(tag)
+        if ranges:
+            index = widget.index(ranges[0])
+            widget.delete(ranges[0], ranges[1])
+        else:
+            index = widget.index(tk.END)
+            for name in widget.tag_names():
+                if name.startswith('partial_') and int(name[8:]) > sequence:
+                    later = widget.tag_ranges(name)
+                    if later and widget.compare(later[0], '<', index):
+                        index = widget.index(later[0])
+        
+        if partial and isinstance(text, list):
+            # Caption spans: only the tentative ones are greyed out
+            widget.tag_config('tentative', foreground=self.colors['text_secondary'])
+            widget.tag_raise('tentative')
+            spans = []
+            for span, tentative in text + [("\n\n", False)]:
+                spans += [span, (tag, 'tentative') if tentative else (tag,)]
+            widget.insert(index, *spans)
+        elif partial:
+            widget.tag_config(tag, foreground=self.colors['text_secondary'])
+            widget.insert(index, text + "\n\n", (tag,))
+        else:
+            widget.tag_delete(tag)
+            widget.insert(index, text + "\n\n")
+        widget.see(tk.END)
+    
+    def show_partial_translation(self, sequence, text):
+        """Show or update a segment's streamed text in place"""
+        for widget in self.get_display_widgets():
+            self.place_segment_text(widget, sequence, text, partial=True)
+    
+    def show_caption(self, sequence, spans):
+        """Show or update a live caption in place: committed text stays, the tentative tail is redrawn"""
+        for widget in self.get_display_widgets():
+            self.place_segment_text(widget, sequence, spans, partial=True)
+    
+    def discard_partial_translation(self, sequence):
+        """Remove a segment's streamed text when it produced no final result"""
+        for widget in self.get_display_widgets():
+            ranges = widget.tag_ranges(f"partial_{sequence}")
+            if ranges:
+                widget.delete(ranges[0], ranges[1])
+            widget.tag_delete(f"partial_{sequence}")
+    
+    def add_translation_to_display(self, translation, sequence=None):
         """Add translation to display"""
         # Add to main window
-        self.translation_text.insert(tk.END, translation + "\n\n")
-        self.translation_text.see(tk.END)
+        if sequence is None:
+            self.translation_text.insert(tk.END, translation + "\n\n")
+            self.translation_text.see(tk.END)
+        else:
+            self.place_segment_text(self.translation_text, sequence, translation, partial=False)
         
         # Add to minimized window if enabled
         if self.is_minimized and self.minimized_window and hasattr(self.minimized_window, 'translation_text'):
-            self.minimized_window.translation_text.insert(tk.END, translation + "\n\n")
-            self.minimized_window.translation_text.see(tk.END)
+            if sequence is None:
+                self.minimized_window.translation_text.insert(tk.END, translation + "\n\n")
+                self.minimized_window.translation_text.see(tk.END)
+            else:
+                self.place_segment_text(self.minimized_window.translation_text, sequence, translation, partial=False)
             
             # Keep minimized window content limited
             mini_lines = self.minimized_window.translation_text.get("1.0", tk.END).split("\n")
@@ -1009,6 +4820,17 @@ If there's no clear speech, respond with 'No speech detected'."""
                 pass
             self.minimized_window = None
         
+        if self.async_engine:
+            self.async_engine.stop()
+        if self.realtime_session:
+            self.realtime_session.stop()
+        
+        self.translation_cache.close()
+        if self.rate_limiter.registry:
+            self.rate_limiter.registry.leave()
+        self.hedge_executor.shutdown(wait=False)
+        self.http_client.close()
+        
         if hasattr(self, 'audio'):
             self.audio.terminate()
 
@@ -0,0 +1,80 @@
+import time
+import unittest
+
+import pytest
+
+for module in ('httpx', 'openai'):
+    pytest.importorskip(module)
+
+from realtime_voice_translator import CircuitBreaker
+
+
+def opened(failure_threshold=2, reset_seconds=30):
+    """A breaker that has just opened"""
+    breaker = CircuitBreaker('Test', failure_threshold, reset_seconds)
+    for _ in range(failure_threshold):
+        breaker.record_failure()
+    return breaker
+
+
+def expire(breaker):
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds - 1
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker('Test', failure_threshold=3)
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker('Test', failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+    def test_lets_one_probe_through_after_the_reset_period(self):
+        breaker = opened()
+        expire(breaker)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_successful_probe_closes_the_circuit(self):
+        breaker = opened()
+        expire(breaker)
+        breaker.allow()
+        breaker.record_success()
+        self.assertIsNone(breaker.opened_at)
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens_for_another_period(self):
+        breaker = opened()
+        expire(breaker)
+        breaker.allow()
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        self.assertFalse(breaker.probing)
+
+    def test_released_probe_lets_another_through(self):
+        breaker = opened()
+        expire(breaker)
+        self.assertTrue(breaker.allow())
+        breaker.release_probe()  # The probe was cancelled before it got an answer
+        self.assertTrue(breaker.allow())
+
+    def test_released_probe_is_not_a_success(self):
+        breaker = opened()
+        expire(breaker)
+        breaker.allow()
+        breaker.release_probe()
+        self.assertIsNotNone(breaker.opened_at)
+        self.assertEqual(breaker.failures, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
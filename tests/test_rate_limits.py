@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+import pytest
+
+for module in ('httpx', 'openai'):
+    pytest.importorskip(module)
+
+import realtime_voice_translator as rvt
+
+
+def make_gemini_only_app():
+    """Just the state schedule_segment reads: Gemini configured, no OpenAI key"""
+    app = object.__new__(rvt.RealtimeVoiceTranslator)
+    app.config = {'selected_audio_model': 'gemini-1.5-flash', 'degraded_audio_model': 'whisper-1',
+                  'rate_limit_max_delay_seconds': 2}
+    app.sample_rate = 16000
+    app.client = None
+    app.gemini_client = object()
+    app.rate_limiter = rvt.RateLimitScheduler(rvt.DEFAULT_RATE_LIMITS)
+    return app
+
+
+class DegradedFallbackTest(unittest.TestCase):
+    def test_exhausted_gemini_quota_is_not_sent_to_unconfigured_openai(self):
+        app = make_gemini_only_app()
+        segment = np.zeros(16000, dtype=np.int16)
+        waits = []
+        # The default 15 rpm Gemini bucket holds a few requests; keep going well past it
+        for _ in range(20):
+            model, wait = app.schedule_segment('gemini-1.5-flash', segment)
+            self.assertEqual(model, 'gemini-1.5-flash')
+            waits.append(wait)
+        self.assertGreater(waits[-1], 2)
+
+    def test_configured_fallback_is_still_used(self):
+        app = make_gemini_only_app()
+        app.client = object()
+        segment = np.zeros(16000, dtype=np.int16)
+        models = {app.schedule_segment('gemini-1.5-flash', segment)[0] for _ in range(20)}
+        self.assertIn('whisper-1', models)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import unittest
+
+import numpy as np
+import pytest
+
+for module in ('httpx', 'openai', 'websockets'):
+    pytest.importorskip(module)
+
+import realtime_voice_translator as rvt
+
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mock_realtime_server.py')
+RATE = rvt.RealtimeSession.SAMPLE_RATE
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('localhost', 0))
+        return probe.getsockname()[1]
+
+
+def tone(seconds):
+    return (3000 * np.sin(np.arange(int(RATE * seconds)) * 0.05)).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(RATE * seconds), dtype=np.int16)
+
+
+class MockReconnectTest(unittest.TestCase):
+    def setUp(self):
+        port = free_port()
+        # Drop the connection after every answered turn
+        self.server = subprocess.Popen([sys.executable, '-u', MOCK_SERVER, '--port', str(port),
+                                        '--drop-after', '1', '--delay', '0'],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        self.addCleanup(self.server.wait, 5)
+        self.addCleanup(self.server.terminate)
+        self.assertIn('listening', self.server.stdout.readline())
+        self.url = f"ws://localhost:{port}"
+
+        self.events = []
+        self.resets = 0
+        self.changed = threading.Condition()
+        config = {'turn_detection': {'type': 'server_vad', 'silence_duration_ms': 300}}
+        self.session = rvt.RealtimeSession(self.url, {}, config, self.on_event, self.on_reset,
+                                           sample_rate=RATE, retry_delay=lambda attempt: 0.1)
+
+    def on_event(self, event):
+        with self.changed:
+            self.events.append(event)
+            if event['type'] == 'conversation.item.input_audio_transcription.completed':
+                self.session.finish_turn(event['item_id'])
+                self.changed.notify_all()
+
+    def stream(self, samples):
+        # In capture-sized chunks, as the recording loop sends them
+        for start in range(0, len(samples), RATE // 16):
+            self.session.send_audio(samples[start:start + RATE // 16])
+
+    def on_reset(self):
+        with self.changed:
+            self.resets += 1
+            self.changed.notify_all()
+
+    def transcripts(self):
+        return [event['transcript'] for event in self.events
+                if event['type'] == 'conversation.item.input_audio_transcription.completed']
+
+    def wait_for(self, predicate, timeout=10):
+        with self.changed:
+            self.assertTrue(self.changed.wait_for(predicate, timeout))
+
+    def test_unfinished_turn_is_replayed_after_a_drop(self):
+        self.session.start()
+        self.addCleanup(self.session.stop)
+        # The second turn's speech reaches the server while it is answering the first, then the
+        # connection drops; it has to be replayed into the next session to be heard at all
+        self.stream(np.concatenate([tone(1.0), silence(0.5), tone(0.8)]))
+        self.wait_for(lambda: self.resets)
+        self.stream(silence(0.5))
+        self.wait_for(lambda: len(self.transcripts()) >= 2)
+
+        self.assertGreaterEqual(self.session.reconnects, 1)
+        self.assertEqual(sum(event['type'] == 'session.created' for event in self.events), 2)
+        first, second = self.transcripts()[:2]
+        self.assertIn('(1.0 s)', first)
+        # The new session heard the replayed speech from its start
+        self.assertIn('(0.8 s)', second)
+
+
+if __name__ == '__main__':
+    unittest.main()